@@ -0,0 +1,306 @@
+"""In-memory stand-in for the parts of the Supabase/PostgREST client the bot uses.
+
+Every `execute()` counts as one round-trip and sleeps for the configured latency, so the
+benchmarks see the same number of requests and roughly the same waiting as production.
+"""
+
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from db import DECAY_FACTOR, DECAY_PERIOD
+
+DEFAULTS = {
+    'punishments': lambda now: {'created_at': now},
+    'infractions': lambda now: {'timestamp': now},
+}
+
+
+def utcnow_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+        self.count = None
+
+
+class FakeSupabase:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables: dict[str, list[dict]] = defaultdict(list)
+        self.round_trips: Counter = Counter()
+        self.rpcs = {'record_ban': self._record_ban, 'punishment_stages': self._punishment_stages}
+        self.ban_writes: set[str] = set()
+        self._next_id: Counter = Counter()
+        self._lock = threading.Lock()
+
+    # client surface
+    def from_(self, table):
+        return FakeQuery(self, table)
+
+    table = from_
+
+    def rpc(self, name, params=None):
+        return FakeRpc(self, name, params or {})
+
+    # helpers for seeding and for the fake queries
+    def insert_rows(self, table, rows):
+        now = utcnow_iso()
+        inserted = []
+        for row in rows:
+            self._next_id[table] += 1
+            full = {'id': self._next_id[table], **DEFAULTS.get(table, lambda _: {})(now), **row}
+            self.tables[table].append(full)
+            inserted.append(dict(full))
+        return inserted
+
+    def total_round_trips(self):
+        return sum(self.round_trips.values())
+
+    def _round_trip(self, key):
+        with self._lock:
+            self.round_trips[key] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _punishment_stages(self, params):
+        stages = {}
+        for row in self.tables['punishments']:
+            if (row['guild_id'] == params['p_guild_id'] and row['user_id'] in params['p_user_ids']
+                    and row['reason'] in params['p_reasons'] and row['stage'] is not None):
+                key = (row['user_id'], row['reason'])
+                stages[key] = max(stages.get(key, 0), int(row['stage']))
+        return [{'user_id': user_id, 'reason': reason, 'stage': stage} for (user_id, reason), stage in stages.items()]
+
+    def _record_ban(self, params):
+        key = params.get('p_key')
+        if key in self.ban_writes:
+            return [dict(row) for row in self.tables['punishments'] if row.get('write_key') == key]
+        self.ban_writes.add(key)
+
+        now = datetime.fromisoformat(params['p_recorded_at']) if params.get('p_recorded_at') else datetime.now(timezone.utc)
+        stamp = {'write_key': key}
+        infractions = self.insert_rows('infractions', [{**row, 'timestamp': now.isoformat(), **stamp} for row in params.get('p_infractions') or []])
+
+        added = defaultdict(float)
+        for row in infractions:
+            added[(row['guild_id'], row['user_id'])] += row['points']
+        scores = {(row['guild_id'], row['user_id']): row for row in self.tables['user_scores']}
+        decay = {row['guild_id']: (row['decay_factor'], row['decay_period_seconds']) for row in self.tables['guild_settings']}
+        for (guild_id, user_id), points in added.items():
+            row = scores.get((guild_id, user_id))
+            if row is None:
+                self.tables['user_scores'].append({'guild_id': guild_id, 'user_id': user_id, 'score': points, 'checkpoint': now.isoformat()})
+                continue
+            decay_factor, decay_period = decay.get(guild_id, (DECAY_FACTOR, DECAY_PERIOD))
+            previous = datetime.fromisoformat(row['checkpoint'])
+            checkpoint = max(previous, now)
+            row['score'] = (row['score'] * decay_factor ** ((checkpoint - previous).total_seconds() / decay_period)
+                            + points * decay_factor ** ((checkpoint - now).total_seconds() / decay_period))
+            row['checkpoint'] = checkpoint.isoformat()
+
+        return self.insert_rows('punishments', [{**row, 'created_at': now.isoformat(), **stamp} for row in params.get('p_punishments') or []])
+
+
+OPERATORS = {
+    'eq': lambda a, b: a == b,
+    'neq': lambda a, b: a != b,
+    'lt': lambda a, b: a < b,
+    'lte': lambda a, b: a <= b,
+    'gt': lambda a, b: a > b,
+    'gte': lambda a, b: a >= b,
+}
+
+
+def _split_terms(text):
+    terms, depth, quoted, current = [], 0, False, ''
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and depth == 0 and char == ',':
+            terms.append(current)
+            current = ''
+            continue
+        current += char
+    return terms + [current]
+
+
+def _parse_term(term):
+    for logic in ('and', 'or'):
+        if term.startswith(f'{logic}('):
+            return _parse_logic(logic, term[len(logic) + 1:-1])
+
+    column, op, value = term.split('.', 2)
+    value = value[1:-1] if value.startswith('"') else value
+    compare = OPERATORS[op]
+
+    def predicate(row):
+        actual = row.get(column)
+        if actual is None:
+            return False
+        expected = type(actual)(value) if isinstance(actual, (int, float)) else value
+        return compare(actual, expected)
+    return predicate
+
+
+def _parse_logic(logic, text):
+    predicates = [_parse_term(term) for term in _split_terms(text)]
+    combine = any if logic == 'or' else all
+    return lambda row: combine(p(row) for p in predicates)
+
+
+class FakeRpc:
+    def __init__(self, client: FakeSupabase, name, params):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        self.client._round_trip(f'rpc:{self.name}')
+        with self.client._lock:
+            return FakeResponse(self.client.rpcs[self.name](self.params))
+
+
+class FakeQuery:
+    def __init__(self, client: FakeSupabase, table):
+        self.client = client
+        self.table = table
+        self.columns = None
+        self.filters = []
+        self.orders = []
+        self.row_limit = None
+        self.offset = 0
+        self.action = 'select'
+        self.payload = None
+        self.negate_next = False
+
+    # builders
+    def select(self, columns='*', **_):
+        self.columns = None if columns.strip() == '*' else [c.strip() for c in columns.split(',')]
+        return self
+
+    def insert(self, data, **_):
+        self.action, self.payload = 'insert', data if isinstance(data, list) else [data]
+        return self
+
+    def upsert(self, data, on_conflict='id', **_):
+        self.action, self.payload = 'upsert', (data if isinstance(data, list) else [data], on_conflict.split(','))
+        return self
+
+    def update(self, data, **_):
+        self.action, self.payload = 'update', data
+        return self
+
+    def delete(self, **_):
+        self.action = 'delete'
+        return self
+
+    @property
+    def not_(self):
+        self.negate_next = True
+        return self
+
+    def _filter(self, predicate):
+        if self.negate_next:
+            self.negate_next = False
+            self.filters.append(lambda row: not predicate(row))
+        else:
+            self.filters.append(predicate)
+        return self
+
+    def eq(self, column, value):
+        return self._filter(lambda row: row.get(column) == value)
+
+    def neq(self, column, value):
+        return self._filter(lambda row: row.get(column) != value)
+
+    def gt(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row[column] > value)
+
+    def gte(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row[column] >= value)
+
+    def lt(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row[column] < value)
+
+    def lte(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row[column] <= value)
+
+    def or_(self, filters, **_):
+        """PostgREST's `or` filter: `col.op.value` terms, `and(...)` groups, values optionally double-quoted."""
+        return self._filter(_parse_logic('or', filters))
+
+    def in_(self, column, values):
+        values = set(values)
+        return self._filter(lambda row: row.get(column) in values)
+
+    def is_(self, column, value):
+        expected = None if value in (None, 'null') else value
+        return self._filter(lambda row: row.get(column) is expected)
+
+    def order(self, column, desc=False, **_):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, size, **_):
+        self.row_limit = size
+        return self
+
+    def range(self, start, end, **_):
+        self.offset, self.row_limit = start, end - start + 1
+        return self
+
+    # execution
+    def execute(self):
+        self.client._round_trip(f'{self.action}:{self.table}')
+        with self.client._lock:
+            return FakeResponse(getattr(self, f'_run_{self.action}')())
+
+    def _matching(self):
+        return [row for row in self.client.tables[self.table] if all(f(row) for f in self.filters)]
+
+    def _run_select(self):
+        rows = self._matching()
+        for column, desc in reversed(self.orders):
+            rows.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+        rows = rows[self.offset:]
+        if self.row_limit is not None:
+            rows = rows[:self.row_limit]
+        if self.columns is None:
+            return [dict(row) for row in rows]
+        return [{c: row.get(c) for c in self.columns} for row in rows]
+
+    def _run_insert(self):
+        return self.client.insert_rows(self.table, self.payload)
+
+    def _run_upsert(self):
+        rows, keys = self.payload
+        result = []
+        for data in rows:
+            existing = next((row for row in self.client.tables[self.table]
+                             if all(row.get(k) == data.get(k) for k in keys)), None)
+            if existing is None:
+                result.extend(self.client.insert_rows(self.table, [data]))
+            else:
+                existing.update(data)
+                result.append(dict(existing))
+        return result
+
+    def _run_update(self):
+        rows = self._matching()
+        for row in rows:
+            row.update(self.payload)
+        return [dict(row) for row in rows]
+
+    def _run_delete(self):
+        rows = self._matching()
+        doomed = {id(row) for row in rows}
+        self.client.tables[self.table] = [row for row in self.client.tables[self.table] if id(row) not in doomed]
+        return [dict(row) for row in rows]
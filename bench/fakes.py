@@ -0,0 +1,154 @@
+"""Minimal discord.py stand-ins: just enough surface for process_ban and the select callbacks."""
+
+import itertools
+
+import discord
+
+_ids = itertools.count(1_000_000)
+
+
+class FakeMessage:
+    def __init__(self, content=None, view=None):
+        self.id = next(_ids)
+        self.content = content
+        self.view = view
+
+    async def edit(self, *, content=None, view=None, **_):
+        if content is not None:
+            self.content = content
+        if view is not None:
+            self.view = view
+        return self
+
+
+class FakeTextChannel:
+    def __init__(self, channel_id, name="bot-commands"):
+        self.id = channel_id
+        self.name = name
+        self.sent: list[str] = []
+
+    async def send(self, content=None, **_):
+        self.sent.append(content)
+        return FakeMessage(content)
+
+
+class FakeThread(FakeTextChannel):
+    def __init__(self, thread_id, name, parent_id):
+        super().__init__(thread_id, name)
+        self.parent_id = parent_id
+        self.archived = False
+
+    async def edit(self, *, archived=None, **_):
+        if archived is not None:
+            self.archived = archived
+        return self
+
+
+class _CreatedThread:
+    def __init__(self, thread, message):
+        self.thread = thread
+        self.message = message
+
+
+class FakeGuild:
+    def __init__(self, guild_id, forum=None):
+        self.id = guild_id
+        self.forum = forum
+
+    async def fetch_channel(self, channel_id):
+        for thread in self.forum.all_threads:
+            if thread.id == channel_id:
+                return thread
+        raise discord.NotFound(_HTTPResponse(404), "Unknown Channel")
+
+
+class _HTTPResponse:
+    def __init__(self, status):
+        self.status = status
+        self.reason = "fake"
+
+
+class FakeForum(discord.ForumChannel):
+    """Passes the isinstance(ForumChannel) check without a gateway connection."""
+
+    def __init__(self, channel_id, guild_id, name="punishments"):
+        self.id = channel_id
+        self.name = name
+        self.guild = FakeGuild(guild_id, self)
+        self.all_threads: list[FakeThread] = []
+
+    @property
+    def threads(self):
+        return [thread for thread in self.all_threads if not thread.archived]
+
+    def get_thread(self, thread_id):
+        return next((t for t in self.threads if t.id == thread_id), None)
+
+    async def archived_threads(self, *, limit=None, **_):
+        for thread in self.all_threads:
+            if thread.archived:
+                yield thread
+
+    async def create_thread(self, *, name, content=None, **_):
+        thread = FakeThread(next(_ids), name, self.id)
+        self.all_threads.append(thread)
+        message = await thread.send(content)
+        return _CreatedThread(thread, message)
+
+
+class FakeUser:
+    def __init__(self, user_id=42, name="bench-mod"):
+        self.id = user_id
+        self.display_name = name
+        self.mention = f"<@{user_id}>"
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def defer(self, **_):
+        self._done = True
+
+    async def send_message(self, content=None, **_):
+        self._done = True
+        self._interaction.original = FakeMessage(content)
+
+    async def edit_message(self, *, content=None, view=None, **_):
+        self._done = True
+        message = self._interaction.message
+        self._interaction.original = message
+        await message.edit(content=content, view=view)
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.sent: list[FakeMessage] = []
+
+    async def send(self, content=None, *, view=None, **_):
+        message = FakeMessage(content, view)
+        self.sent.append(message)
+        return message
+
+
+class FakeInteraction:
+    def __init__(self, client, guild_id, channel_id, user=None, message=None):
+        self.id = next(_ids)
+        self.client = client
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.channel = None
+        self.user = user or FakeUser()
+        self.message = message
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup()
+        self.original = None
+
+    async def edit_original_response(self, *, content=None, view=None, **_):
+        if self.original is None:
+            self.original = FakeMessage()
+        return await self.original.edit(content=content, view=view)
@@ -0,0 +1,292 @@
+"""Offline benchmarks for the ban hot paths.
+
+Runs process_ban, the /avoid select callback and calculate_total_decayed_points against an
+in-memory Supabase stand-in with per-request latency (or an in-memory SQLite backend) and
+fake Discord objects, then reports p50/p99 latency, DB round-trips and peak allocations per
+scenario. Every run is saved under bench/results/ and can be compared with an earlier one:
+
+    python bench/run.py --latency-ms 20 --iterations 20
+    python bench/run.py --backend sqlite
+    python bench/run.py --compare latest
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / "bench" / "results"
+sys.path.insert(0, str(ROOT / "src"))
+
+# config.py reads these at import time; the values only have to be well-formed.
+for key, value in {
+    "DISCORD_TOKEN": "bench",
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_KEY": "bench",
+    "THREAD_CHANNEL_ID": "100",
+    "ADMIN_BOT_CHANNEL_ID": "200",
+    "GUILD_ID": "300",
+    # Keep the bench's ban writes out of the bot's real outbox.
+    "OUTBOX_PATH": os.path.join(tempfile.mkdtemp(prefix="hammer-bench-"), "outbox.sqlite3"),
+    # The import-time backend is replaced per iteration; an in-memory one needs no network.
+    "STORAGE_BACKEND": "sqlite",
+    "SQLITE_PATH": ":memory:",
+}.items():
+    os.environ.setdefault(key, value)
+
+import bot as bot_module  # noqa: E402
+import db  # noqa: E402
+from config import ADMIN_BOT_CHANNEL_ID, GUILD_ID, THREAD_CHANNEL_ID  # noqa: E402
+from fake_supabase import FakeSupabase  # noqa: E402
+from fakes import FakeForum, FakeInteraction, FakeMessage, FakeTextChannel  # noqa: E402
+from metrics import metrics  # noqa: E402
+from storage.sqlite_backend import SQLiteBackend  # noqa: E402
+from storage.supabase_backend import SupabaseBackend  # noqa: E402
+
+REASONS = [f"Reason {i}" for i in range(1, 11)]
+REASON_COUNTS = (1, 3, 5, 10)
+INFRACTION_COUNTS = (0, 100, 1_000, 10_000)
+USERNAME = "bench-user"
+IP = "203.0.113.7"
+
+
+def seed_rows(prior_infractions: int, rng: random.Random):
+    """Catalog with 10 reasons x 12 stages, one earlier punishment per reason and N infractions."""
+    now = datetime.now(timezone.utc)
+    tables = {
+        "catalog": [
+            {"reason": reason, "stage": stage, "amount": stage, "points": stage, "unit": "days"}
+            for reason in REASONS for stage in range(1, 13)
+        ],
+        "punishments": [
+            {**db.punishment_row(GUILD_ID, USERNAME, IP, reason, 1, 1, 1.0, 0.0, 1), "created_at": now.isoformat()}
+            for reason in REASONS
+        ],
+        "infractions": [
+            {"guild_id": GUILD_ID, "user_id": USERNAME, "points": float(rng.randint(1, 3)), "context": rng.choice(REASONS),
+             "source": "automated", "timestamp": (now - timedelta(seconds=rng.randrange(2 * 365 * 86_400))).isoformat()}
+            for _ in range(prior_infractions)
+        ],
+    }
+
+    parsed = [{"points": row["points"], "timestamp": datetime.fromisoformat(row["timestamp"])} for row in tables["infractions"]]
+    tables["user_scores"] = [
+        {"guild_id": GUILD_ID, "user_id": USERNAME, "score": db.calculate_total_decayed_points(parsed, now),
+         "checkpoint": now.isoformat()}
+    ] if parsed else []
+    return tables, parsed
+
+
+async def make_backend(name, latency, tables):
+    if name == "sqlite":
+        backend = SQLiteBackend(":memory:", decay_factor=db.DECAY_FACTOR, decay_period=db.DECAY_PERIOD)
+        for table, rows in tables.items():
+            await backend.import_rows(table, rows)
+        return backend
+
+    fake = FakeSupabase(latency)
+    for table, rows in tables.items():
+        fake.insert_rows(table, rows)
+    return SupabaseBackend(client=fake)
+
+
+def db_queries():
+    return sum(value for (name, _), value in metrics._counters.items() if name == "db_queries_total")
+
+
+async def reset(backend_name, latency, prior_infractions, rng):
+    """Fresh database and empty bot-side caches for one iteration."""
+    tables, parsed = seed_rows(prior_infractions, rng)
+    db.backend.close()
+    db.backend = await make_backend(backend_name, latency, tables)
+
+    await bot_module.catalog.reload()
+    bot_module.thread_index._ids.clear()
+    bot_module.prefetcher._entries.clear()
+    forum = FakeForum(THREAD_CHANNEL_ID, GUILD_ID)
+    bot_module.dispatcher._channels.update({
+        THREAD_CHANNEL_ID: forum,
+        ADMIN_BOT_CHANNEL_ID: FakeTextChannel(ADMIN_BOT_CHANNEL_ID),
+    })
+    await bot_module.thread_index.warm(forum)  # thread posts wait for it
+    return parsed
+
+
+async def run_process_ban(reasons, parsed):
+    interaction = FakeInteraction(bot_module.bot, GUILD_ID, ADMIN_BOT_CHANNEL_ID)
+    await bot_module.process_ban(interaction, reasons, USERNAME, IP)
+
+
+async def run_avoid(reasons, parsed):
+    view = bot_module.PunishmentAvoidView(bot_module.catalog.select_options(), USERNAME, IP)
+    message = FakeMessage(view=view)
+    select = view.children[0]
+    select.item._values = list(reasons)
+    interaction = FakeInteraction(bot_module.bot, GUILD_ID, ADMIN_BOT_CHANNEL_ID, message=message)
+    await select.callback(interaction)
+
+
+async def run_decay(reasons, parsed):
+    db.calculate_total_decayed_points(parsed, datetime.now(timezone.utc))
+
+
+SCENARIOS = {
+    "process_ban": (run_process_ban, REASON_COUNTS),
+    "avoid_callback": (run_avoid, REASON_COUNTS),
+    "decay": (run_decay, (0,)),
+}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+async def measure(name, runner, n_reasons, prior_infractions, backend_name, latency, iterations, rng):
+    reasons = REASONS[:n_reasons]
+    timings = []
+    round_trips = []
+
+    for _ in range(iterations):
+        parsed = await reset(backend_name, latency, prior_infractions, rng)
+        queries_before = db_queries()
+        started = time.perf_counter()
+        await runner(reasons, parsed)
+        timings.append((time.perf_counter() - started) * 1000)
+        # Replayed writes still cost a round trip each, just not on the moderator's clock.
+        await db.outbox.drain()
+        round_trips.append(db_queries() - queries_before)
+        await bot_module.dispatcher._queue.join()
+
+    # Allocations are measured on a separate pass so tracing does not skew the timings.
+    parsed = await reset(backend_name, latency, prior_infractions, rng)
+    tracemalloc.start()
+    await runner(reasons, parsed)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await db.outbox.drain()
+    await bot_module.dispatcher._queue.join()
+
+    return {
+        "scenario": name,
+        "reasons": n_reasons,
+        "prior_infractions": prior_infractions,
+        "p50_ms": round(percentile(timings, 0.50), 3),
+        "p99_ms": round(percentile(timings, 0.99), 3),
+        "round_trips": round(sum(round_trips) / len(round_trips), 2),
+        "peak_alloc_kib": round(peak / 1024, 1),
+    }
+
+
+async def run_all(args):
+    rng = random.Random(args.seed)
+    results = []
+    for name, (runner, reason_counts) in SCENARIOS.items():
+        if args.scenario and name not in args.scenario:
+            continue
+        for n_reasons in reason_counts:
+            for prior_infractions in INFRACTION_COUNTS:
+                # The bot logs every ban; keep that out of the report unless asked for.
+                with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+                    result = await measure(name, runner, n_reasons, prior_infractions, args.backend,
+                                           args.latency_ms / 1000, args.iterations, rng)
+                results.append(result)
+                print(f"{name:<15} reasons={n_reasons:<3} infractions={prior_infractions:<6} "
+                      f"p50={result['p50_ms']:>9.3f}ms p99={result['p99_ms']:>9.3f}ms "
+                      f"round_trips={result['round_trips']:<5} peak={result['peak_alloc_kib']}KiB")
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def resolve_previous(compare):
+    if compare != "latest":
+        return Path(compare)
+    runs = sorted(RESULTS_DIR.glob("*.json"))
+    return runs[-1] if runs else None
+
+
+def compare_runs(previous, current, threshold):
+    """Prints per-scenario deltas and returns the number of regressions above `threshold` percent."""
+    baseline = {(r["scenario"], r["reasons"], r["prior_infractions"]): r for r in previous["results"]}
+    regressions = 0
+
+    print(f"\nCompared with {previous['meta'].get('revision')} ({previous['meta']['timestamp']}):")
+    for result in current:
+        key = (result["scenario"], result["reasons"], result["prior_infractions"])
+        before = baseline.get(key)
+        if before is None:
+            continue
+
+        deltas = []
+        for metric in ("p50_ms", "p99_ms", "round_trips"):
+            change = (result[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+            flag = " ⚠️" if change > threshold else ""
+            regressions += bool(flag)
+            deltas.append(f"{metric} {before[metric]} → {result[metric]} ({change:+.1f}%){flag}")
+        print(f"  {key[0]:<15} reasons={key[1]:<3} infractions={key[2]:<6} " + " | ".join(deltas))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("supabase", "sqlite"), default="supabase", help="storage backend to run against")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="simulated latency per Supabase request")
+    parser.add_argument("--iterations", type=int, default=20, help="timed runs per scenario")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="only run these scenarios")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--compare", help="earlier result file to compare with, or 'latest'")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold in percent")
+    parser.add_argument("--no-save", action="store_true", help="do not write the results file")
+    parser.add_argument("--verbose", action="store_true", help="show the bot's own log output")
+    args = parser.parse_args()
+
+    previous_path = resolve_previous(args.compare) if args.compare else None
+    results = asyncio.run(run_all(args))
+
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    run = {
+        "meta": {
+            "timestamp": timestamp,
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "backend": args.backend,
+            "latency_ms": args.latency_ms,
+            "iterations": args.iterations,
+        },
+        "results": results,
+    }
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        path = RESULTS_DIR / f"{timestamp}.json"
+        path.write_text(json.dumps(run, indent=2))
+        print(f"\nSaved results to {path.relative_to(ROOT)}")
+
+    if previous_path is not None:
+        regressions = compare_runs(json.loads(previous_path.read_text()), results, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+-- Writes every punishment and infraction row of one ban in a single request.
+-- The function body runs in one transaction, so a ban is either fully recorded or not at all.
+
+create or replace function record_ban(p_punishments jsonb, p_infractions jsonb)
+returns setof punishments
+language plpgsql
+as $$
+begin
+    insert into infractions (user_id, points, context, source)
+    select user_id, points, context, source
+    from jsonb_populate_recordset(null::infractions, coalesce(p_infractions, '[]'::jsonb));
+
+    return query
+    insert into punishments (user_id, ip, reason, base_days, points, multiplier,
+                             final_duration, stage, total_points_at_ban)
+    select user_id, ip, reason, base_days, points, multiplier,
+           final_duration, stage, total_points_at_ban
+    from jsonb_populate_recordset(null::punishments, coalesce(p_punishments, '[]'::jsonb))
+    returning *;
+end;
+$$;
@@ -0,0 +1,47 @@
+-- Per-user decayed-points rollup.
+-- Each row holds the user's decayed total as of `checkpoint`; the value at any later time t is
+--     score * 0.95 ^ ((t - checkpoint) / 60 days)
+-- so reading it is one primary-key lookup and every new infraction advances it in O(1).
+
+create table if not exists user_scores (
+    user_id    text primary key,
+    score      double precision not null default 0,
+    checkpoint timestamptz not null default now()
+);
+
+-- Seed the rollup from the existing history with the same stepped decay the bot used so far.
+insert into user_scores (user_id, score, checkpoint)
+select user_id,
+       sum(points * power(0.95, floor(extract(epoch from (now() - "timestamp")) / 5184000))),
+       now()
+from infractions
+group by user_id
+on conflict (user_id) do nothing;
+
+create or replace function record_ban(p_punishments jsonb, p_infractions jsonb)
+returns setof punishments
+language plpgsql
+as $$
+begin
+    insert into infractions (user_id, points, context, source)
+    select user_id, points, context, source
+    from jsonb_populate_recordset(null::infractions, coalesce(p_infractions, '[]'::jsonb));
+
+    insert into user_scores as s (user_id, score, checkpoint)
+    select user_id, sum(points), now()
+    from jsonb_populate_recordset(null::infractions, coalesce(p_infractions, '[]'::jsonb))
+    group by user_id
+    on conflict (user_id) do update
+    set score = s.score * power(0.95, greatest(extract(epoch from (excluded.checkpoint - s.checkpoint)), 0) / 5184000)
+                + excluded.score,
+        checkpoint = excluded.checkpoint;
+
+    return query
+    insert into punishments (user_id, ip, reason, base_days, points, multiplier,
+                             final_duration, stage, total_points_at_ban)
+    select user_id, ip, reason, base_days, points, multiplier,
+           final_duration, stage, total_points_at_ban
+    from jsonb_populate_recordset(null::punishments, coalesce(p_punishments, '[]'::jsonb))
+    returning *;
+end;
+$$;
@@ -0,0 +1,49 @@
+-- Idempotent ban writes.
+-- The bot records every write in a local outbox first and may replay it more than once, so
+-- record_ban now takes the write's idempotency key. A key that was already applied returns the
+-- rows it wrote the first time instead of inserting them again.
+
+alter table punishments add column if not exists write_key text;
+alter table infractions add column if not exists write_key text;
+create index if not exists punishments_write_key_idx on punishments (write_key);
+
+create table if not exists ban_writes (
+    key        text primary key,
+    created_at timestamptz not null default now()
+);
+
+drop function if exists record_ban(jsonb, jsonb);
+
+create or replace function record_ban(p_key text, p_punishments jsonb, p_infractions jsonb)
+returns setof punishments
+language plpgsql
+as $$
+begin
+    insert into ban_writes (key) values (p_key) on conflict (key) do nothing;
+    if not found then
+        return query select * from punishments where write_key = p_key;
+        return;
+    end if;
+
+    insert into infractions (user_id, points, context, source, write_key)
+    select user_id, points, context, source, p_key
+    from jsonb_populate_recordset(null::infractions, coalesce(p_infractions, '[]'::jsonb));
+
+    insert into user_scores as s (user_id, score, checkpoint)
+    select user_id, sum(points), now()
+    from jsonb_populate_recordset(null::infractions, coalesce(p_infractions, '[]'::jsonb))
+    group by user_id
+    on conflict (user_id) do update
+    set score = s.score * power(0.95, greatest(extract(epoch from (excluded.checkpoint - s.checkpoint)), 0) / 5184000)
+                + excluded.score,
+        checkpoint = excluded.checkpoint;
+
+    return query
+    insert into punishments (user_id, ip, reason, base_days, points, multiplier,
+                             final_duration, stage, total_points_at_ban, write_key)
+    select user_id, ip, reason, base_days, points, multiplier,
+           final_duration, stage, total_points_at_ban, p_key
+    from jsonb_populate_recordset(null::punishments, coalesce(p_punishments, '[]'::jsonb))
+    returning *;
+end;
+$$;
@@ -0,0 +1,5 @@
+-- Indexes for /history, which pages through one user's rows newest first with a
+-- (time, id) keyset cursor.
+
+create index if not exists punishments_user_created_idx on punishments (user_id, created_at desc, id desc);
+create index if not exists infractions_user_timestamp_idx on infractions (user_id, "timestamp" desc, id desc);
@@ -0,0 +1,76 @@
+-- Multi-guild support.
+-- One bot process now serves many guilds. Each guild's channels and decay parameters live in
+-- guild_settings, and every punishment, infraction and score row belongs to one guild.
+--
+-- Rows written so far belong to the one guild the bot served until now. Replace <GUILD_ID>
+-- below with that guild's id (the GUILD_ID environment variable) before running this file.
+
+create table if not exists guild_settings (
+    guild_id             bigint primary key,
+    thread_channel_id    bigint not null,
+    admin_channel_id     bigint not null,
+    allowed_channel_ids  bigint[] not null default '{}',
+    decay_factor         double precision not null default 0.95,
+    decay_period_seconds double precision not null default 5184000
+);
+
+alter table punishments add column if not exists guild_id bigint;
+alter table infractions add column if not exists guild_id bigint;
+alter table user_scores add column if not exists guild_id bigint;
+
+update punishments set guild_id = <GUILD_ID> where guild_id is null;
+update infractions set guild_id = <GUILD_ID> where guild_id is null;
+update user_scores set guild_id = <GUILD_ID> where guild_id is null;
+
+alter table punishments alter column guild_id set not null;
+alter table infractions alter column guild_id set not null;
+alter table user_scores alter column guild_id set not null;
+
+alter table user_scores drop constraint if exists user_scores_pkey;
+alter table user_scores add primary key (guild_id, user_id);
+
+-- Every per-user lookup is now scoped to a guild, so the guild leads each index.
+drop index if exists punishments_user_created_idx;
+drop index if exists infractions_user_timestamp_idx;
+create index if not exists punishments_guild_user_reason_idx on punishments (guild_id, user_id, reason, created_at desc);
+create index if not exists punishments_guild_user_created_idx on punishments (guild_id, user_id, created_at desc, id desc);
+create index if not exists infractions_guild_user_timestamp_idx on infractions (guild_id, user_id, "timestamp" desc, id desc);
+
+create or replace function record_ban(p_key text, p_punishments jsonb, p_infractions jsonb)
+returns setof punishments
+language plpgsql
+as $$
+begin
+    insert into ban_writes (key) values (p_key) on conflict (key) do nothing;
+    if not found then
+        return query select * from punishments where write_key = p_key;
+        return;
+    end if;
+
+    insert into infractions (guild_id, user_id, points, context, source, write_key)
+    select guild_id, user_id, points, context, source, p_key
+    from jsonb_populate_recordset(null::infractions, coalesce(p_infractions, '[]'::jsonb));
+
+    -- Scores decay with their guild's settings, the defaults for a guild without a row.
+    insert into user_scores as s (guild_id, user_id, score, checkpoint)
+    select guild_id, user_id, sum(points), now()
+    from jsonb_populate_recordset(null::infractions, coalesce(p_infractions, '[]'::jsonb))
+    group by guild_id, user_id
+    on conflict (guild_id, user_id) do update
+    set score = s.score * power(
+                    coalesce((select g.decay_factor from guild_settings g where g.guild_id = s.guild_id), 0.95),
+                    greatest(extract(epoch from (excluded.checkpoint - s.checkpoint)), 0)
+                    / coalesce((select g.decay_period_seconds from guild_settings g where g.guild_id = s.guild_id), 5184000)
+                )
+                + excluded.score,
+        checkpoint = excluded.checkpoint;
+
+    return query
+    insert into punishments (guild_id, user_id, ip, reason, base_days, points, multiplier,
+                             final_duration, stage, total_points_at_ban, write_key)
+    select guild_id, user_id, ip, reason, base_days, points, multiplier,
+           final_duration, stage, total_points_at_ban, p_key
+    from jsonb_populate_recordset(null::punishments, coalesce(p_punishments, '[]'::jsonb))
+    returning *;
+end;
+$$;
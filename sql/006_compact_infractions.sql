@@ -0,0 +1,65 @@
+-- Infraction compaction.
+-- Infractions only ever accumulate, but after enough decay periods an old one adds next to
+-- nothing to a user's total. compact_infractions folds every infraction worth less than
+-- p_epsilon decayed points into a single per-user summary row and moves the originals to
+-- infractions_archive, so the per-user reads stay short. The summary is worth exactly the
+-- decayed total of the rows it replaces at compaction time. Punishments and user_scores are
+-- not touched, so stages and the score rollup are unaffected.
+
+create table if not exists infractions_archive (
+    id          bigint primary key,
+    guild_id    bigint not null,
+    user_id     text not null,
+    points      double precision not null,
+    context     text,
+    source      text,
+    "timestamp" timestamptz not null,
+    write_key   text,
+    archived_at timestamptz not null default now()
+);
+
+create or replace function compact_infractions(p_epsilon double precision, p_max_users integer)
+returns table (users integer, archived integer)
+language plpgsql
+as $$
+declare
+    v_now timestamptz := now();
+begin
+    -- The same stepped decay as calculate_total_decayed_points, with each guild's settings.
+    create temporary table compacted on commit drop as
+    with decayed as (
+        select i.id, i.guild_id, i.user_id, i.source,
+               i.points * power(
+                   coalesce(g.decay_factor, 0.95),
+                   floor(extract(epoch from (v_now - i."timestamp")) / coalesce(g.decay_period_seconds, 5184000))
+               ) as value
+        from infractions i
+        left join guild_settings g on g.guild_id = i.guild_id
+    ),
+    -- Only users with new rows to fold qualify; a summary on its own is already compacted.
+    targets as (
+        select distinct guild_id, user_id from decayed
+        where value < p_epsilon and source is distinct from 'compacted'
+        limit p_max_users
+    )
+    select d.*
+    from decayed d
+    join targets t on t.guild_id = d.guild_id and t.user_id = d.user_id
+    where d.value < p_epsilon or d.source = 'compacted';
+
+    insert into infractions_archive (id, guild_id, user_id, points, context, source, "timestamp", write_key, archived_at)
+    select i.id, i.guild_id, i.user_id, i.points, i.context, i.source, i."timestamp", i.write_key, v_now
+    from infractions i
+    where i.id in (select id from compacted);
+
+    delete from infractions where id in (select id from compacted);
+
+    insert into infractions (guild_id, user_id, points, context, source, "timestamp")
+    select guild_id, user_id, sum(value), count(*) || ' decayed infraction(s) compacted', 'compacted', v_now
+    from compacted
+    group by guild_id, user_id;
+
+    return query
+    select count(distinct (guild_id, user_id))::integer, count(*)::integer from compacted;
+end;
+$$;
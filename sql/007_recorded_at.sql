@@ -0,0 +1,51 @@
+-- Ban writes keep the time they were recorded.
+-- Writes reach record_ban through the bot's local outbox, and after an outage that can be long
+-- after the ban. record_ban now takes the moment the write was recorded locally and uses it for
+-- the infraction timestamps, the punishment created_at and the user_scores checkpoint, so a
+-- replayed ban decays from when it happened. A write older than the user's checkpoint decays its
+-- own points up to that checkpoint instead of moving it back.
+
+drop function if exists record_ban(text, jsonb, jsonb);
+
+create or replace function record_ban(p_key text, p_punishments jsonb, p_infractions jsonb, p_recorded_at timestamptz default now())
+returns setof punishments
+language plpgsql
+as $$
+begin
+    insert into ban_writes (key) values (p_key) on conflict (key) do nothing;
+    if not found then
+        return query select * from punishments where write_key = p_key;
+        return;
+    end if;
+
+    insert into infractions (guild_id, user_id, points, context, source, "timestamp", write_key)
+    select guild_id, user_id, points, context, source, p_recorded_at, p_key
+    from jsonb_populate_recordset(null::infractions, coalesce(p_infractions, '[]'::jsonb));
+
+    -- Scores decay with their guild's settings, the defaults for a guild without a row.
+    insert into user_scores as s (guild_id, user_id, score, checkpoint)
+    select guild_id, user_id, sum(points), p_recorded_at
+    from jsonb_populate_recordset(null::infractions, coalesce(p_infractions, '[]'::jsonb))
+    group by guild_id, user_id
+    on conflict (guild_id, user_id) do update
+    set score = s.score * power(
+                    coalesce((select g.decay_factor from guild_settings g where g.guild_id = s.guild_id), 0.95),
+                    greatest(extract(epoch from (excluded.checkpoint - s.checkpoint)), 0)
+                    / coalesce((select g.decay_period_seconds from guild_settings g where g.guild_id = s.guild_id), 5184000)
+                )
+                + excluded.score * power(
+                    coalesce((select g.decay_factor from guild_settings g where g.guild_id = s.guild_id), 0.95),
+                    greatest(extract(epoch from (s.checkpoint - excluded.checkpoint)), 0)
+                    / coalesce((select g.decay_period_seconds from guild_settings g where g.guild_id = s.guild_id), 5184000)
+                ),
+        checkpoint = greatest(s.checkpoint, excluded.checkpoint);
+
+    return query
+    insert into punishments (guild_id, user_id, ip, reason, base_days, points, multiplier,
+                             final_duration, stage, total_points_at_ban, created_at, write_key)
+    select guild_id, user_id, ip, reason, base_days, points, multiplier,
+           final_duration, stage, total_points_at_ban, p_recorded_at, p_key
+    from jsonb_populate_recordset(null::punishments, coalesce(p_punishments, '[]'::jsonb))
+    returning *;
+end;
+$$;
@@ -0,0 +1,19 @@
+-- Highest recorded stage per user and reason.
+-- Reading every punishment row of every user in a /banip-bulk file could hit PostgREST's row
+-- limit (1000 by default) and silently drop rows, which makes stages come out too low.
+-- punishment_stages returns one row per (user_id, reason) pair instead, so the response is at
+-- most users x reasons rows however long the histories are.
+
+create or replace function punishment_stages(p_guild_id bigint, p_user_ids text[], p_reasons text[])
+returns table (user_id text, reason text, stage integer)
+language sql
+stable
+as $$
+    select p.user_id, p.reason, max(p.stage)::integer
+    from punishments p
+    where p.guild_id = p_guild_id
+      and p.user_id = any(p_user_ids)
+      and p.reason = any(p_reasons)
+      and p.stage is not null
+    group by p.user_id, p.reason;
+$$;
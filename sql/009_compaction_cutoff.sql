@@ -0,0 +1,97 @@
+-- Compaction reads only the infractions old enough to qualify.
+-- compact_infractions used to decay every infraction on each run. An infraction of p points is
+-- worth less than p_epsilon only after more than ln(p_epsilon / p) / ln(decay_factor) whole decay
+-- periods, so the smallest live points and the fastest guild decay give a timestamp no qualifying
+-- row can be newer than. The run now reads the rows before that cutoff through the timestamp
+-- index, and only the summaries of the users it folds.
+
+create index if not exists infractions_timestamp_idx on infractions ("timestamp");
+create index if not exists infractions_live_points_idx on infractions (points)
+    where source is distinct from 'compacted';
+
+create or replace function compact_infractions(p_epsilon double precision, p_max_users integer)
+returns table (users integer, archived integer)
+language plpgsql
+as $$
+declare
+    v_now timestamptz := now();
+    v_min_points double precision;
+    v_cutoff timestamptz;
+begin
+    select min(points) into v_min_points from infractions where source is distinct from 'compacted';
+    if v_min_points is null then
+        return query select 0, 0;
+        return;
+    end if;
+
+    if v_min_points <= p_epsilon then
+        v_cutoff := v_now;
+    else
+        -- The floor keeps the cutoff a step early so rounding never skips a row; a guild without
+        -- decay never qualifies and is left out.
+        select v_now - make_interval(secs => min(
+                   period * floor(ln(p_epsilon / v_min_points) / ln(factor))
+               ))
+        into v_cutoff
+        from (
+            select decay_factor as factor, decay_period_seconds as period from guild_settings
+            union all
+            select 0.95, 5184000
+        ) d
+        where factor < 1;
+    end if;
+
+    if v_cutoff is null then
+        return query select 0, 0;
+        return;
+    end if;
+
+    -- The same stepped decay as calculate_total_decayed_points, with each guild's settings.
+    create temporary table compacted on commit drop as
+    with decayed as (
+        select i.id, i.guild_id, i.user_id, i.source,
+               i.points * power(
+                   coalesce(g.decay_factor, 0.95),
+                   floor(extract(epoch from (v_now - i."timestamp")) / coalesce(g.decay_period_seconds, 5184000))
+               ) as value
+        from infractions i
+        left join guild_settings g on g.guild_id = i.guild_id
+        where i."timestamp" <= v_cutoff and i.source is distinct from 'compacted'
+    ),
+    targets as (
+        select distinct guild_id, user_id from decayed
+        where value < p_epsilon
+        limit p_max_users
+    )
+    select d.id, d.guild_id, d.user_id, d.value
+    from decayed d
+    join targets t on t.guild_id = d.guild_id and t.user_id = d.user_id
+    where d.value < p_epsilon
+    union all
+    -- The user's earlier summary is folded into the new one.
+    select i.id, i.guild_id, i.user_id,
+           i.points * power(
+               coalesce(g.decay_factor, 0.95),
+               floor(extract(epoch from (v_now - i."timestamp")) / coalesce(g.decay_period_seconds, 5184000))
+           )
+    from infractions i
+    join targets t on t.guild_id = i.guild_id and t.user_id = i.user_id
+    left join guild_settings g on g.guild_id = i.guild_id
+    where i.source = 'compacted';
+
+    insert into infractions_archive (id, guild_id, user_id, points, context, source, "timestamp", write_key, archived_at)
+    select i.id, i.guild_id, i.user_id, i.points, i.context, i.source, i."timestamp", i.write_key, v_now
+    from infractions i
+    where i.id in (select id from compacted);
+
+    delete from infractions where id in (select id from compacted);
+
+    insert into infractions (guild_id, user_id, points, context, source, "timestamp")
+    select guild_id, user_id, sum(value), count(*) || ' decayed infraction(s) compacted', 'compacted', v_now
+    from compacted
+    group by guild_id, user_id;
+
+    return query
+    select count(distinct (guild_id, user_id))::integer, count(*)::integer from compacted;
+end;
+$$;
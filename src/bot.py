@@ -1,22 +1,54 @@
+import time
+BOOT_STARTED = time.perf_counter()  # before the heavy imports, so the startup log includes them
+
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import re
 import discord
 from math import log2
 from discord.ext import commands
 from discord import app_commands
 from discord.app_commands import CheckFailure, AppCommandError
 from datetime import datetime, timedelta
+from urllib.parse import quote, unquote
 from zoneinfo import ZoneInfo
 from db import (
-    get_all_punishment_options,
-    add_punishment,
-    get_user_stage,
-    get_catalog_punishment,
-    fetch_user_infractions,
-    calculate_total_decayed_points,
-    log_infraction,
-    get_latest_punishment,
-    get_previous_reasons_for_user
+    outbox,
+    warm_up,
+    fetch_guild_settings,
+    save_guild_settings,
+    punishment_row,
+    infraction_row,
+    record_ban,
+    was_recorded,
+    get_user_stages,
+    get_stages_for_users,
+    get_decayed_points,
+    get_decayed_points_many,
+    fetch_all_infractions,
+    get_latest_punishments,
+    fetch_punishment_index,
+    fetch_scored_users,
+    fetch_history_page,
+    compact_infractions
 )
-from config import DISCORD_TOKEN, THREAD_CHANNEL_ID, ADMIN_BOT_CHANNEL_ID, GUILD_ID
+from catalog import catalog
+from guilds import GuildSettings, guild_settings
+from decay import InfractionColumns, decayed_totals
+from threads import thread_index
+from ipindex import ip_index, address_key
+from completions import usernames, ips, load_completions, add_completions
+from menus import LiveMenus
+from locks import user_locks
+from dispatch import Dispatcher
+from prefetch import Prefetcher
+from metrics import metrics
+from config import DISCORD_TOKEN, PREFETCH_TTL_SECONDS
+from config import METRICS_HOST, METRICS_PORT, COMMAND_SYNC_STATE_PATH, LIVE_MENUS_MAX, LIVE_MENUS_TTL_SECONDS
+from config import HISTORY_PAGE_SIZE, COMPACTION_INTERVAL_SECONDS, COMPACTION_EPSILON, COMPACTION_BATCH_USERS
 
 
 # ======================================================================================================================
@@ -30,55 +62,257 @@ intents = discord.Intents.default()
 intents.guilds = True
 intents.members = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+# Shards are picked and connected by discord.py, so one process serves every guild the bot is in.
+bot = commands.AutoShardedBot(command_prefix="!", intents=intents)
+dispatcher = Dispatcher(bot)
+prefetcher = Prefetcher(PREFETCH_TTL_SECONDS)
+live_menus = LiveMenus(LIVE_MENUS_MAX, LIVE_MENUS_TTL_SECONDS)
+background_tasks: set[asyncio.Task] = set()
+startup_marks: list[tuple[str, float]] = [("imports", time.perf_counter())]
+
+
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+
+def mark_startup(stage):
+    startup_marks.append((stage, time.perf_counter()))
+
+
+def log_startup_timings():
+    previous = BOOT_STARTED
+    parts = []
+    for stage, at in startup_marks:
+        parts.append(f"{stage} {at - previous:.2f}s")
+        metrics.observe("startup_seconds", at - previous, stage=stage)
+        previous = at
+    print(f"⏱️  Startup took {previous - BOOT_STARTED:.2f}s: " + " · ".join(parts))
+
+
+def command_tree_hash():
+    payload = [command.to_dict(bot.tree) for command in bot.tree.get_commands()]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def read_sync_state():
+    try:
+        with open(COMMAND_SYNC_STATE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+async def sync_command_tree():
+    """Registers the slash commands globally, but only when they changed since the last sync.
+
+    One global registration covers every guild the bot is in or joins later, so adding a guild
+    needs no sync at all. The hash of the last synced tree is kept in COMMAND_SYNC_STATE_PATH,
+    so a crash restart with unchanged commands skips the sync entirely.
+    """
+    digest = command_tree_hash()
+
+    state = read_sync_state()
+    if state.get("scope") == "global" and state.get("hash") == digest:
+        print("⚔️  Slash commands unchanged, skipping sync")
+        return
+
+    synced = await bot.tree.sync()
+    if state.get("guild_id"):
+        # Commands used to be registered on a single guild; drop those so they are not listed twice.
+        await bot.tree.sync(guild=discord.Object(id=state["guild_id"]))
+    with open(COMMAND_SYNC_STATE_PATH, "w", encoding="utf-8") as f:
+        json.dump({"scope": "global", "hash": digest}, f)
+    print(f"⚔️🔁  Synced: {len(synced)} slash command ready for battle!")
+
+
+async def warm_caches():
+    """Loads the storage client, guild settings, catalog and thread indexes in the background while the gateway connects."""
+    try:
+        await warm_up()
+        guild_settings.load(await fetch_guild_settings())
+    except Exception as e:
+        print(f"⚠️  **Error** loading guild settings: {e}")
+    mark_startup("guilds")
+
+    try:
+        await catalog.reload()
+    except Exception as e:
+        print(f"⚠️  **Error** loading punishment catalog: {e}")
+    mark_startup("catalog")
+
+    try:
+        punishments, scored_users = await asyncio.gather(fetch_punishment_index(), fetch_scored_users())
+        ip_index.load(punishments)
+        load_completions(punishments, scored_users)
+    except Exception as e:
+        print(f"⚠️  **Error** building the IP and autocomplete indexes: {e}")
+    mark_startup("indexes")
+
+    # Thread posts wait for their forum's index, so every guild's forum is listed at once.
+    await bot.wait_until_ready()
+    await asyncio.gather(*(warm_thread_index(settings) for settings in guild_settings.all()))
+    mark_startup("threads")
+    log_startup_timings()
+
+
+async def compact_periodically():
+    """Every COMPACTION_INTERVAL_SECONDS, folds fully decayed infractions into per-user summaries.
+
+    Each batch covers at most COMPACTION_BATCH_USERS users in one transaction; a full batch means
+    more is waiting, so batches repeat until the backlog is gone.
+    """
+    while True:
+        await asyncio.sleep(COMPACTION_INTERVAL_SECONDS)
+        users = archived = 0
+        try:
+            with metrics.span("compaction"):
+                while True:
+                    result = await compact_infractions(COMPACTION_EPSILON, COMPACTION_BATCH_USERS)
+                    users += result['users']
+                    archived += result['archived']
+                    if result['users'] < COMPACTION_BATCH_USERS:
+                        break
+        except Exception as e:
+            print(f"⚠️  **Error** compacting infractions: {e}")
+        metrics.inc("infractions_compacted_total", archived)
+        if archived:
+            print(f"🗜️  Compacted {archived} decayed infraction(s) of {users} user(s)")
+
+
+async def warm_thread_index(settings: GuildSettings):
+    try:
+        forum_channel = await dispatcher.channel(settings.thread_channel_id)
+        await thread_index.warm(forum_channel)
+    except Exception as e:
+        print(f"⚠️  **Error** indexing punishment threads of guild {settings.guild_id}: {e}")
+        thread_index.release(settings.thread_channel_id)
+
+
+async def report_dead_letter(entry, error):
+    """Tells the guild's admin channel about a ban write the database rejected for good."""
+    rows = [*entry["punishments"], *entry["infractions"]]
+    # Writes queued before multi-guild support carry no guild_id; they belong to the home guild.
+    settings = guild_settings.get(rows[0]["guild_id"]) if rows and "guild_id" in rows[0] else guild_settings.default
+    if settings is None:
+        return
+    users = ", ".join(sorted({row["user_id"] for row in rows}))
+    dispatcher.send(
+        settings.admin_channel_id,
+        f"❌ The database rejected the ban write for **{users}**, so it was not saved: `{error}`. "
+        f"It is kept in the outbox's dead letters as `{entry['key']}` and replayed again when the bot restarts.",
+        label=f"Dead-letter report for {users}",
+        report_channel_id=settings.admin_channel_id
+    )
 
 
 @bot.event
-async def on_ready():
-    await bot.change_presence(activity=discord.Game(name=f"on {VERSION}"))
-    print(f"🔨🗡️  {bot.user} is now online and watching over the realm! [{VERSION}]")
+async def setup_hook():
+    # Runs once per process after login, before the gateway connects; anything slow here delays
+    # the bot coming online, so only the command sync is awaited.
+    mark_startup("login")
+    bot.add_dynamic_items(PunishmentSelect, PunishmentAvoidSelect)
+    outbox.on_dead_letter = report_dead_letter
+    outbox.start()
+    if outbox.pending:
+        print(f"📮 Replaying {len(outbox.pending)} ban write(s) left in the outbox")
+    if METRICS_PORT:
+        try:
+            await metrics.serve(METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            print(f"⚠️  **Error** starting metrics endpoint: {e}")
+
+    run_in_background(warm_caches())
+    if COMPACTION_INTERVAL_SECONDS:
+        run_in_background(compact_periodically())
+
     try:
-        guild = discord.Object(id=GUILD_ID)
-        print(guild)
-        synced = await bot.tree.sync()
-        print(f"⚔️🔁  Synced: {len(synced)} slash command ready for battle!")
+        await sync_command_tree()
     except Exception as e:
         print(f"⚠️  **Error** syncing commands: {e}")
+    mark_startup("command sync")
 
 
-class PunishmentSelect(discord.ui.Select):
-    def __init__(self, punishments, username, ip):
-        MAX_LENGTH = 100
+@bot.event
+async def on_ready():
+    # Also fires after every gateway reconnect, so it only does cheap, repeatable work.
+    if not any(stage == "gateway" for stage, _ in startup_marks):
+        mark_startup("gateway")
+    await bot.change_presence(activity=discord.Game(name=f"on {VERSION}"))
+    print(f"🔨🗡️  {bot.user} is now online and watching over {len(bot.guilds)} realm(s) on {bot.shard_count} shard(s)! [{VERSION}]")
 
-        options = []
-        seen_reasons = set()
 
-        for p in punishments:
-            reason = p["reason"]
-            if reason in seen_reasons:
-                continue
-            seen_reasons.add(reason)
+@bot.event
+async def on_guild_join(guild: discord.Guild):
+    if guild_settings.get(guild.id) is None:
+        print(f"🏰 Joined {guild.name} ({guild.id}); it needs /configure before the commands work there")
+
+
+@bot.event
+async def on_thread_create(thread: discord.Thread):
+    if thread.parent_id in guild_settings.forum_ids():
+        thread_index.add(thread.parent_id, thread.name, thread.id)
+
+
+@bot.event
+async def on_raw_thread_delete(payload: discord.RawThreadDeleteEvent):
+    if payload.parent_id in guild_settings.forum_ids():
+        thread_index.discard(payload.thread_id)
+
+
+MAX_CUSTOM_ID_LENGTH = 100
+
+
+def menu_custom_id(kind, username, ip):
+    """Encodes a menu's state into its custom_id, so the menu keeps working after a restart."""
+    custom_id = f"hammer:{kind}:{quote(ip, safe='')}:{quote(username, safe='')}"
+    if len(custom_id) > MAX_CUSTOM_ID_LENGTH:
+        raise ValueError("the username and IP are too long to fit in a menu")
+    return custom_id
+
 
-            label = reason[:90] + "..." if len(reason) > MAX_LENGTH else reason
-            value = reason[:MAX_LENGTH]
+def submission_key(kind, interaction):
+    """Idempotency key of a menu submission, stored with its write: a menu is applied once however often it is used."""
+    return f"{kind}:{interaction.message.id}"
 
-            options.append(discord.SelectOption(label=label, value=value))
 
-        super().__init__(
+ALREADY_SUBMITTED = "⚠️ This menu was already submitted, nothing more was written."
+
+
+def mark_submitted(interaction):
+    """Tells the menu's background preview, if it is still running, to leave the menu alone."""
+    view = live_menus.pop(interaction.message.id) if interaction.message else None
+    if view is not None:
+        view.submitted = True
+
+
+class PunishmentSelect(discord.ui.DynamicItem[discord.ui.Select], template=r"hammer:ban:(?P<ip>[^:]*):(?P<username>[^:]+)"):
+    def __init__(self, options, username, ip):
+        super().__init__(discord.ui.Select(
             placeholder="Choose one or more punishment reasons",
             min_values=1,
             max_values=len(options),
-            options=options
-        )
+            options=options,
+            custom_id=menu_custom_id("ban", username, ip)
+        ))
         self.username = username
         self.ip = ip
 
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(item.options, unquote(match["username"]), unquote(match["ip"]))
+
+    @metrics.timed("banip.select")
     async def callback(self, interaction: discord.Interaction):
+        mark_submitted(interaction)
         await interaction.response.defer(ephemeral=True)
-        await process_ban(interaction, self.values, self.username, self.ip)
+        # A menu from before a restart can be used before warm_caches has loaded the catalog.
+        await catalog.ensure_loaded()
+        await process_ban(interaction, self.item.values, self.username, self.ip, key=submission_key("ban", interaction))
 
-        for child in self.view.children:       # disable every component
-            child.disabled = True
+        self.item.disabled = True
 
         try:                                   # update the original message
             await interaction.edit_original_response(view=self.view)
@@ -87,80 +321,54 @@ class PunishmentSelect(discord.ui.Select):
 
 
 class PunishmentSelectView(discord.ui.View):
-    def __init__(self, punishments, username, ip):
+    def __init__(self, options, username, ip):
+        # The select is rebuilt from its custom_id on every use, so discord.py keeps no reference
+        # to this view once it is sent and there is nothing to time out.
         super().__init__(timeout=None)
-        self.add_item(PunishmentSelect(punishments, username, ip))
-
-
-class PunishmentAvoidSelect(discord.ui.Select):
-    def __init__(self, punishments, username, ip):
-        MAX_LENGTH = 100
-
-        options = []
-        seen_reasons = set()
-
-        for p in punishments:
-            reason = p["reason"]
-            if reason in seen_reasons:
-                continue
-            seen_reasons.add(reason)
+        self.submitted = False
+        self.add_item(PunishmentSelect(options, username, ip))
 
-            label = reason[:90] + "..." if len(reason) > MAX_LENGTH else reason
-            value = reason[:MAX_LENGTH]
 
-            options.append(discord.SelectOption(label=label, value=value))
-
-
-        super().__init__(
+class PunishmentAvoidSelect(discord.ui.DynamicItem[discord.ui.Select], template=r"hammer:avoid:(?P<ip>[^:]*):(?P<username>[^:]+)"):
+    def __init__(self, options, username, ip):
+        super().__init__(discord.ui.Select(
             placeholder="Select reason(s) to re-apply",
             min_values=1,
             max_values=len(options),
-            options=options
-        )
+            options=options,
+            custom_id=menu_custom_id("avoid", username, ip)
+        ))
         self.username = username
         self.ip = ip
 
-    async def callback(self, interaction: discord.Interaction):
-        total_hours = 0
-        reason_list = []
-        final_duration_display = ""
-        max_multiplier = 1
-        total_points_at_ban = 0
-
-        for reason in self.values:
-            prev = get_latest_punishment(self.username, reason)
-            if not prev:
-                await interaction.response.send_message(
-                    f"⚠️ No previous punishment found for `{reason}`.",
-                    ephemeral=True
-                )
-                return
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(item.options, unquote(match["username"]), unquote(match["ip"]))
 
-            unit = prev.get("unit")
-            if not unit:
-                catalog = get_catalog_punishment(prev["reason"], prev["stage"])
-                unit = catalog["unit"] if catalog else "days"
-
-            base = prev.get("amount") or prev.get("base_days")
-            multiplier = prev.get("multiplier", 1)
-            max_multiplier = max(max_multiplier, multiplier)
-            total_points_at_ban = max(total_points_at_ban, prev.get("total_points_at_ban", 0))
-
-            hours = base * {"minutes": 1 / 60, "hours": 1, "days": 24, "weeks": 168}.get(unit, 24)
-            total_hours += hours
-            reason_list.append(reason)
+    @metrics.timed("avoid.select")
+    async def callback(self, interaction: discord.Interaction):
+        mark_submitted(interaction)
+        # Acknowledged before waiting on the user's lock, which a ban of the same user may hold.
+        await interaction.response.defer()
+        await catalog.ensure_loaded()  # as for PunishmentSelect
+        await self.reapply(interaction, submission_key("avoid", interaction))
+
+    async def reapply(self, interaction: discord.Interaction, key):
+        settings = guild_settings.get(interaction.guild_id)
+        if settings is None:
+            await interaction.followup.send(not_configured_message(), ephemeral=True)
+            return
 
-            # Log each one individually
-            add_punishment(
-                self.username,
-                self.ip,
-                reason,
-                base,
-                0,  # no points for avoid
-                multiplier,
-                prev.get("total_points_at_ban", 0),
-                explicit_stage=prev["stage"]
-            )
+        # Held from the read of the latest punishments to the write, released before any Discord call.
+        async with user_locks.hold((settings.guild_id, self.username)):
+            plan, error = await self.record(settings, key)
+        if error:
+            await interaction.followup.send(error, ephemeral=True)
+            return
+        total_hours = plan["total_hours"]
+        reason_list = plan["reason_list"]
+        max_multiplier = plan["max_multiplier"]
+        total_points_at_ban = plan["total_points_at_ban"]
 
         # Ban timing
         now = datetime.now(ZoneInfo("America/New_York"))
@@ -200,85 +408,247 @@ class PunishmentAvoidSelect(discord.ui.Select):
             f"**Issued By:** {moderator} ({mod_name})"
         )
 
-        # Thread or create
-        forum_channel = interaction.client.get_channel(THREAD_CHANNEL_ID) or \
-                        await interaction.client.fetch_channel(THREAD_CHANNEL_ID)
-
-        thread = discord.utils.get(forum_channel.threads, name=self.username)
-        if thread:
-            await thread.send(message, silent=True)
-            thread_link = thread.id
-        else:
-            thread = await forum_channel.create_thread(
-                name=self.username,
-                content=message,
-                auto_archive_duration=60,
-                reason="Punishment re-issued",
-                allowed_mentions=discord.AllowedMentions.none()
-            )
-            thread_link = thread.thread.id
-
-        link = f"https://discord.com/channels/{interaction.guild_id}/{thread_link}"
-
-        # Admin bot command
-        try:
-            admin_chan = await interaction.client.fetch_channel(ADMIN_BOT_CHANNEL_ID)
-            await admin_chan.send(
-                f"$admin banip {self.ip} \"{self.username}\" \"{reason_string} [AVOID]\" {final_duration}"
-            )
-        except Exception as e:
-            print("❌ Failed to send admin avoid command:", e)
+        # Thread post and admin bot command go out in the background, in this order
+        forum_channel = await dispatcher.channel(settings.thread_channel_id)
+        known_thread_id, pending_thread = queue_thread_post(settings, forum_channel, self.username, message, "Punishment re-issued")
+        dispatcher.send(
+            settings.admin_channel_id,
+            f"$admin banip {self.ip} \"{self.username}\" \"{reason_string} [AVOID]\" {final_duration}",
+            label=f"Admin avoid command for {self.username}",
+            report_channel_id=settings.admin_channel_id
+        )
 
         # Respond to mod
-        await interaction.response.send_message(
+        body = (
         f"""```ansi
 [2;34m[1;34m{self.username}[0m[2;34m[0m has been re-banned for [2;34m[1;34m{final_duration_display}[0m[2;34m[0m due to [2;34m[1;34m{reason_string} [AVOID][0m[2;34m[0m
     ```\n"""
-            f"**[View punishment thread]({link})**"
         )
+        # Disabling the menu edits the deferred response; it works on menus from before a restart too.
+        self.item.disabled = True
+        with metrics.span("avoid.reply"):
+            await interaction.edit_original_response(view=self.view)
+            reply = await interaction.followup.send(body + thread_link_line(settings, known_thread_id), wait=True)
+        if known_thread_id is None:
+            run_in_background(relink_when_posted(reply.edit, body, pending_thread, settings))
 
-        self.disabled = True
-        await self.view.message.edit(view=self.view)
+    async def record(self, settings: GuildSettings, key):
+        """Re-applies the latest punishment of every selected reason; the caller holds the user's lock.
 
+        Returns (plan, None) once written, or (None, message) for the moderator if nothing was.
+        """
+        user = (settings.guild_id, self.username)
+        total_hours = 0
+        reason_list = []
+        max_multiplier = 1
+        total_points_at_ban = 0
+        punishment_rows = []
 
-class PunishmentAvoidView(discord.ui.View):
-    def __init__(self, reasons, username, ip):
-        super().__init__(timeout=None)
-        self.add_item(PunishmentAvoidSelect(reasons, username, ip))
+        if await was_recorded(key):
+            return None, ALREADY_SUBMITTED
+
+        with metrics.span("avoid.load"):
+            latest = await prefetcher.result("avoid", user)
+            if latest is None:
+                latest = await get_latest_punishments(settings.guild_id, self.username, self.item.values)
+
+        for reason in self.item.values:
+            prev = latest.get(reason)
+            if not prev:
+                return None, f"⚠️ No previous punishment found for `{reason}`."
+
+            unit = prev.get("unit")
+            if not unit:
+                template = catalog.get(prev["reason"], prev["stage"])
+                unit = template["unit"] if template else "days"
+
+            base = prev.get("amount") or prev.get("base_days")
+            multiplier = prev.get("multiplier", 1)
+            max_multiplier = max(max_multiplier, multiplier)
+            total_points_at_ban = max(total_points_at_ban, prev.get("total_points_at_ban", 0))
 
+            hours = base * {"minutes": 1 / 60, "hours": 1, "days": 24, "weeks": 168}.get(unit, 24)
+            total_hours += hours
+            reason_list.append(reason)
+
+            punishment_rows.append(punishment_row(
+                settings.guild_id,
+                self.username,
+                self.ip,
+                reason,
+                base,
+                0,  # no points for avoid
+                multiplier,
+                prev.get("total_points_at_ban", 0),
+                prev["stage"]
+            ))
+
+        try:
+            with metrics.span("avoid.write"):
+                recorded = await record_ban(punishment_rows, key=key)
+        except Exception as e:
+            print(f"❌ Failed to record avoid for {self.username}: {e}")
+            return None, "❌ Failed to record the punishment, nothing was written. Please try again."
+        if recorded is None:
+            return None, ALREADY_SUBMITTED
+        prefetcher.invalidate(user)
+        index_written_rows(punishment_rows)
+        plan = {
+            "total_hours": total_hours,
+            "reason_list": reason_list,
+            "max_multiplier": max_multiplier,
+            "total_points_at_ban": total_points_at_ban,
+        }
+        return plan, None
 
 
 class PunishmentAvoidView(discord.ui.View):
-    def __init__(self, reasons, username, ip):
+    def __init__(self, options, username, ip):
+        # See PunishmentSelectView: nothing is kept once the menu is sent.
         super().__init__(timeout=None)
-        self.add_item(PunishmentAvoidSelect(reasons, username, ip))
+        self.submitted = False
+        self.add_item(PunishmentAvoidSelect(options, username, ip))
+
+
+def thread_link_line(settings: GuildSettings, thread_id):
+    # Until a new thread exists, link the forum itself.
+    return f"**[View punishment thread](https://discord.com/channels/{settings.guild_id}/{thread_id or settings.thread_channel_id})**"
+
+
+def queue_thread_post(settings: GuildSettings, forum_channel, username, message, reason):
+    """Queues the post to the user's thread. Returns (thread id if already known, future of the thread id)."""
+    async def post():
+        return await thread_index.post(forum_channel, username, message, reason)
+
+    label = f"Thread post for {username}"
+    if thread_index.is_warm(forum_channel.id):
+        return thread_index.get_id(forum_channel.id, username), dispatcher.submit(
+            label, post, report_channel_id=settings.admin_channel_id
+        )
+
+    # Right after a restart: wait for the forum's index here, outside the dispatcher's queue, so
+    # admin commands and other guilds' posts are not held up behind it.
+    async def submit_when_warm():
+        await thread_index.wait_warm(forum_channel.id)
+        return await dispatcher.submit(label, post, report_channel_id=settings.admin_channel_id)
+
+    return None, asyncio.ensure_future(submit_when_warm())
 
 
-async def process_ban(interaction, reasons, username, ip):
+async def relink_when_posted(edit, body, pending_thread, settings: GuildSettings):
+    """Points a reply at the user's thread once the dispatcher has created it."""
+    thread_id = await pending_thread
+    if thread_id is None:  # the dispatcher already reported the failure
+        return
+    try:
+        await edit(content=body + thread_link_line(settings, thread_id))
+    except discord.HTTPException as e:
+        print(f"⚠️ Could not add thread link to reply: {e}")
+
+
+def index_written_rows(rows):
+    """Keeps the in-memory IP and autocomplete indexes current after a write."""
+    ip_index.add_rows(rows)
+    add_completions(rows)
+
+
+def ban_multiplier(decayed_points):
+    return max(log2(decayed_points + 1), 1)
+
+
+async def load_ban_context(guild_id, username, reasons):
+    """Everything process_ban reads before writing: next stage per reason and the decayed total."""
+    now = datetime.now(ZoneInfo("America/New_York"))
+    stages, decayed_points = await asyncio.gather(
+        get_user_stages(guild_id, username, reasons),
+        get_decayed_points(guild_id, username, now),
+    )
+    return {"stages": stages, "decayed_points": decayed_points}
+
+
+async def show_ban_preview(view, message, pending):
+    """Annotates each reason in an open /banip menu with the duration it would get."""
+    try:
+        context = await pending
+    except Exception:
+        return
+    if view.submitted:
+        return
+
+    multiplier = ban_multiplier(context["decayed_points"])
+    for option in view.children[0].item.options:
+        stage = context["stages"].get(option.value, 1)
+        template = catalog.get(option.value, stage)
+        if template:
+            unit = template.get("unit", "days")
+            option.description = (
+                f"Stage {stage} · {template['amount']} {unit} × {multiplier:.2f} = "
+                f"{int(template['amount'] * multiplier)} {unit}"
+            )
+        else:
+            option.description = f"No template for stage {stage}"
+
+    try:
+        await message.edit(
+            content=f"**Decayed Total:** {context['decayed_points']}  |  **Multiplier:** x{multiplier:.2f}",
+            view=view
+        )
+    except discord.HTTPException as e:
+        print(f"⚠️ Could not show ban preview: {e}")
+
+
+async def show_avoid_preview(view, message, pending):
+    """Annotates each reason in an open /avoid menu with the punishment it would re-apply."""
+    try:
+        latest = await pending
+    except Exception:
+        return
+    if view.submitted:
+        return
+
+    for option in view.children[0].item.options:
+        prev = latest.get(option.value)
+        if prev:
+            option.description = (
+                f"Stage {prev['stage']} · {prev.get('amount') or prev.get('base_days')} "
+                f"× {prev.get('multiplier') or 1:.2f}"
+            )
+        else:
+            option.description = "No previous punishment"
+
+    try:
+        await message.edit(view=view)
+    except discord.HTTPException as e:
+        print(f"⚠️ Could not show avoid preview: {e}")
+
+
+class MissingTemplateError(Exception):
+    pass
+
+
+def plan_ban(guild_id, username, ip, reasons, stages, decayed_points):
+    """Works out durations, rows and the admin command for a ban without touching Discord or the DB."""
     total_amount = 0
     total_points = 0
     unit = "days"
+    templates = {}
 
     for reason in reasons:
-        stage = get_user_stage(username, reason)
-        template = get_catalog_punishment(reason, stage)
+        stage = stages[reason]
+        template = catalog.get(reason, stage)
         if not template:
-            await interaction.followup.send(f"⚠️ No template found for `{reason}` at stage {stage}.", ephemeral=True)
-            return
+            raise MissingTemplateError(f"No template found for `{reason}` at stage {stage}.")
+        templates[reason] = template
         total_amount += template['amount']
         total_points += template['points']
         unit = template.get('unit', unit)
 
     now = datetime.now(ZoneInfo("America/New_York"))
-    infractions = fetch_user_infractions(username)
-    decayed_points = calculate_total_decayed_points(infractions, now, test_mode=False)
-
-    multiplier = max(log2(decayed_points + 1), 1)
+    multiplier = ban_multiplier(decayed_points)
 
     unit_abbrev = {"minutes": "m", "hours": "h", "days": "d", "weeks": "w"}.get(unit, "d")
     final_duration_value = int(total_amount * multiplier)
     final_duration = f"{final_duration_value}{unit_abbrev}"
-    final_duration_string = f"{final_duration_value} {unit}"
 
     match unit:
         case "minutes": duration_converted = total_amount / 60
@@ -287,93 +657,171 @@ async def process_ban(interaction, reasons, username, ip):
         case "weeks": duration_converted = total_amount * 168
 
     ban_end = now + timedelta(hours=duration_converted)
-    unix_timestamp = int(ban_end.timestamp())
+    reason_list = ", ".join(reasons)
 
-    for reason in reasons:
-        stage = get_user_stage(username, reason)
-        template = get_catalog_punishment(reason, stage)
-        add_punishment(username, ip, reason, template['amount'], template['points'], multiplier, decayed_points)
-        log_infraction(username, template['points'], reason)
+    return {
+        "username": username,
+        "ip": ip,
+        "reason_list": reason_list,
+        "total_amount": total_amount,
+        "total_points": total_points,
+        "unit": unit,
+        "multiplier": multiplier,
+        "decayed_points": decayed_points,
+        "final_duration_value": final_duration_value,
+        "unix_timestamp": int(ban_end.timestamp()),
+        "command": f"$admin banip {ip} \"{username}\" \"{reason_list}\" {final_duration}",
+        "punishment_rows": [
+            punishment_row(guild_id, username, ip, reason, templates[reason]['amount'], templates[reason]['points'],
+                           multiplier, decayed_points, stages[reason])
+            for reason in reasons
+        ],
+        "infraction_rows": [infraction_row(guild_id, username, templates[reason]['points'], reason) for reason in reasons],
+    }
+
+
+def queue_ban_thread_post(settings: GuildSettings, forum_channel, plan, moderator: discord.abc.User):
+    """Queues the thread post for a recorded ban. Returns queue_thread_post's result."""
+    message = (
+        f"**IP Address:** {plan['ip']}\n"
+        f"**Reasons:** {plan['reason_list']}\n\n"
+        f"**Base Duration Sum:** {plan['total_amount']} {plan['unit']}\n"
+        f"**Multiplier Applied:** x{plan['multiplier']:.2f}\n\n"
+        f"**Points Added:** {plan['total_points']}  |  **Decayed Total:** {plan['decayed_points']}\n\n"
+        f"**Final Duration:** `{plan['final_duration_value']} {plan['unit']}`\n"
+        f"**Ban Ends:** <t:{plan['unix_timestamp']}:F>\n\n"
+        f"**Issued By:** {moderator.mention} ({moderator.display_name})"
+    )
 
-    forum_channel = bot.get_channel(THREAD_CHANNEL_ID)
-    if forum_channel is None:
-        forum_channel = await bot.fetch_channel(THREAD_CHANNEL_ID)
+    return queue_thread_post(settings, forum_channel, plan["username"], message, "Punishment issued")
 
-    if not isinstance(forum_channel, discord.ForumChannel):
-        print("❌ Forum channel not found or incorrect type.")
-        return
 
-    moderator = interaction.user.mention
-    mod_name = interaction.user.display_name
-    reason_list = ", ".join(reasons)
+def queue_admin_command(settings: GuildSettings, plan):
+    dispatcher.send(settings.admin_channel_id, plan["command"], label=f"Admin banip command for {plan['username']}",
+                    report_channel_id=settings.admin_channel_id)
+    print(f"📨 Queued banip command: {plan['command']}")
 
-    message = (
-        f"**IP Address:** {ip}\n"
-        f"**Reasons:** {reason_list}\n\n"
-        f"**Base Duration Sum:** {total_amount} {unit}\n"
-        f"**Multiplier Applied:** x{multiplier:.2f}\n\n"
-        f"**Points Added:** {total_points}  |  **Decayed Total:** {decayed_points}\n\n"
-        f"**Final Duration:** `{final_duration_string}`\n"
-        f"**Ban Ends:** <t:{unix_timestamp}:F>\n\n"
-        f"**Issued By:** {moderator} ({mod_name})"
-    )
 
-    thread = discord.utils.get(forum_channel.threads, name=username)
-    if thread:
-        await thread.send(message, silent=True)
-        thread_link = thread.id
-    else:
-        thread = await forum_channel.create_thread(
-            name=username,
-            content=message,
-            auto_archive_duration=60,
-            reason="Punishment issued",
-            allowed_mentions=discord.AllowedMentions.none()
-        )
-        thread_link = thread.thread.id
+async def record_planned_ban(settings: GuildSettings, reasons, username, ip, key):
+    """Reads the user's stages, plans the ban and records it; the caller holds the user's lock.
+
+    Returns (plan, None) once written, or (None, message) for the moderator if nothing was.
+    """
+    user = (settings.guild_id, username)
+    if key is not None and await was_recorded(key):
+        return None, ALREADY_SUBMITTED
 
-    link = f"https://discord.com/channels/{interaction.guild_id}/{thread_link}"
+    # Resolve every stage once so the template lookup and the write agree on it.
+    prefetched = await prefetcher.result("ban", user)
+    if prefetched is None or not set(reasons) <= prefetched["stages"].keys():
+        with metrics.span("process_ban.load"):
+            prefetched = await load_ban_context(settings.guild_id, username, reasons)
 
-    cmd = f"$admin banip {ip} \"{username}\" \"{reason_list}\" {final_duration}"
     try:
-        admin_bot_channel = await bot.fetch_channel(ADMIN_BOT_CHANNEL_ID)
-        print(f"[Debug] Fetched admin channel: {admin_bot_channel}")
-        await admin_bot_channel.send(cmd)
-        print(f"📨 Sent banip command: {cmd}")
-    except Exception as e:
-        print(f"❌ Failed to send admin command: {e}")
+        plan = plan_ban(settings.guild_id, username, ip, reasons, prefetched["stages"], prefetched["decayed_points"])
+    except MissingTemplateError as e:
+        return None, f"⚠️ {e}"
 
     try:
-        await interaction.followup.send(
+        with metrics.span("process_ban.write"):
+            recorded = await record_ban(plan["punishment_rows"], plan["infraction_rows"], key=key)
+    except Exception as e:
+        print(f"❌ Failed to record ban for {username}: {e}")
+        return None, "❌ Failed to record the ban, nothing was written. Please try again."
+    if recorded is None:
+        return None, ALREADY_SUBMITTED
+    prefetcher.invalidate(user)
+    index_written_rows(plan["punishment_rows"])
+    return plan, None
+
+
+@metrics.timed("process_ban")
+async def process_ban(interaction, reasons, username, ip, *, key=None):
+    settings = guild_settings.get(interaction.guild_id)
+    if settings is None:
+        await interaction.followup.send(not_configured_message(), ephemeral=True)
+        return
+
+    # One ban of a user at a time, held from the stage read to the write so the next one sees
+    # this one's rows, and released before any Discord call.
+    async with user_locks.hold((settings.guild_id, username)):
+        plan, error = await record_planned_ban(settings, reasons, username, ip, key)
+    if error:
+        await interaction.followup.send(error, ephemeral=True)
+        return
+
+    forum_channel = await dispatcher.channel(settings.thread_channel_id)
+
+    if not isinstance(forum_channel, discord.ForumChannel):
+        print("❌ Forum channel not found or incorrect type.")
+        return
+
+    known_thread_id, pending_thread = queue_ban_thread_post(settings, forum_channel, plan, interaction.user)
+    queue_admin_command(settings, plan)
+
+    body = (
             f"""```ansi
-[2;34m[1;34m{username}[0m[2;34m[0m has been punished for [2;34m[1;34m{final_duration_value} {unit}[0m[2;34m[0m due to [2;34m[1;34m{reason_list}[0m[2;34m[0m
+[2;34m[1;34m{username}[0m[2;34m[0m has been punished for [2;34m[1;34m{plan['final_duration_value']} {plan['unit']}[0m[2;34m[0m due to [2;34m[1;34m{plan['reason_list']}[0m[2;34m[0m
 ```
 """
-            f"**[View punishment thread]({link})**"
-        )
+    )
+    try:
+        with metrics.span("process_ban.reply"):
+            reply = await interaction.followup.send(body + thread_link_line(settings, known_thread_id), wait=True)
     except discord.errors.NotFound:
+        metrics.inc("interactions_expired_total", command="banip")
         print("⚠️ Could not send followup message — interaction expired.")
+        return
 
+    if known_thread_id is None:
+        run_in_background(relink_when_posted(reply.edit, body, pending_thread, settings))
 
-ALLOWED_CHANNELS: set[int] = {
-    ADMIN_BOT_CHANNEL_ID,
-}
+
+def not_configured_message():
+    return "❌ Hammer is not set up in this server yet. Someone with Manage Server can run `/configure`."
+
+def mod_channel_message(interaction: discord.Interaction):
+    """Why the channel gate failed, for the commands' error handlers."""
+    settings = guild_settings.get(interaction.guild_id)
+    if settings is None:
+        return not_configured_message()
+    return "❌ This command can only be used in <#{}>.".format(settings.admin_channel_id)
 
 def in_mod_channel():
     async def predicate(interaction: discord.Interaction):
-        return interaction.channel_id == ADMIN_BOT_CHANNEL_ID
+        settings = guild_settings.get(interaction.guild_id)
+        return settings is not None and interaction.channel_id in settings.command_channel_ids
     return app_commands.check(predicate)
 
 def in_allowed_channel(inter: discord.Interaction):
+    settings = guild_settings.get(inter.guild_id)
+    if settings is None:
+        return False
     cid = inter.channel_id
     # if the command was executed in a thread, also allow its parent
     parent = getattr(inter.channel, "parent_id", None)
-    return cid in ALLOWED_CHANNELS or parent in ALLOWED_CHANNELS
+    return cid in settings.command_channel_ids or parent in settings.command_channel_ids
+
+
+def autocomplete_from(index):
+    """Autocomplete callback over an in-memory PrefixIndex; never touches the database."""
+    async def complete(interaction: discord.Interaction, current: str):
+        settings = guild_settings.get(interaction.guild_id)
+        if settings is None or interaction.channel_id not in settings.command_channel_ids:
+            return []  # same gate as the command, so names and IPs stay in the mod channel
+        return [app_commands.Choice(name=value, value=value) for value in index.complete(settings.guild_id, current)]
+    return complete
+
+
+complete_username = autocomplete_from(usernames)
+complete_ip = autocomplete_from(ips)
 
 
 @bot.tree.command(name="banip", description="Ban a user using a points-based system.")
 @app_commands.describe(username="Username of the user to ban", ip="IPv4 address of the user")
+@app_commands.autocomplete(username=complete_username, ip=complete_ip)
 @in_mod_channel()
+@metrics.timed("command.banip")
 async def banip(interaction: discord.Interaction, username: str, ip: str):
     try:
         await interaction.response.defer(ephemeral=True)
@@ -382,15 +830,24 @@ async def banip(interaction: discord.Interaction, username: str, ip: str):
         print(f"[banip] ⚠️ Interaction already responded to for {username} @ {ip}")
         return
     except discord.errors.NotFound:
+        metrics.inc("interactions_expired_total", command="banip")
         print(f"[banip] ⚠️ Interaction expired or unknown for {username} @ {ip}")
         return
 
-    punishment_options = get_all_punishment_options()
-    print(f"[banip] Fetched punishment options: {len(punishment_options)} found")
+    await catalog.ensure_loaded()
+    print(f"[banip] Using cached punishment options: {len(catalog.options)} reasons")
 
-    if punishment_options:
-        view = PunishmentSelectView(punishment_options, username, ip)
-        await interaction.followup.send(content="", view=view, ephemeral=True)
+    if catalog.options:
+        try:
+            view = PunishmentSelectView(catalog.select_options(), username, ip)
+        except ValueError as e:
+            await interaction.followup.send(f"⚠️ Cannot open the menu: {e}.", ephemeral=True)
+            return
+        reasons = [option.value for option in catalog.options]
+        pending = prefetcher.start("ban", (interaction.guild_id, username), lambda: load_ban_context(interaction.guild_id, username, reasons))
+        message = await interaction.followup.send(content="", view=view, ephemeral=True)
+        live_menus.add(message.id, view)
+        run_in_background(show_ban_preview(view, message, pending))
     else:
         await interaction.followup.send("No punishment templates found.", ephemeral=True)
 
@@ -401,7 +858,7 @@ async def banip_error(interaction: discord.Interaction, error: AppCommandError):
     if isinstance(error, CheckFailure):
         # the channel gate failed
         await interaction.response.send_message(
-            "❌ This command can only be used in <#{}>.".format(ADMIN_BOT_CHANNEL_ID),
+            mod_channel_message(interaction),
             ephemeral=True
         )
     else:
@@ -409,10 +866,63 @@ async def banip_error(interaction: discord.Interaction, error: AppCommandError):
         raise error
 
 
+MAX_LINKED_ACCOUNTS = 15
+MAX_LINKED_REASONS = 3
+MAX_LINKED_SUMMARY = 1900  # Discord rejects messages over 2000 characters
+
+
+def linked_accounts_summary(guild_id, username, query):
+    """Lists the other accounts punished from addresses matching `query`, with their reasons."""
+    if not ip_index.loaded:
+        return "🔗 IP index is still loading, linked accounts are not available yet."
+    try:
+        accounts = ip_index.lookup(guild_id, query)
+    except ValueError:
+        return f"🔗 `{query}` is not an IP address or range, no linked-account lookup."
+
+    accounts.pop(username, None)
+    if not accounts:
+        return f"🔗 No other accounts punished from `{query}`."
+
+    lines = [f"🔗 **{len(accounts)} linked account(s) on `{query}`:**"]
+    length = len(lines[0])
+    shown = 0
+    for user_id in sorted(accounts)[:MAX_LINKED_ACCOUNTS]:
+        reasons = sorted(accounts[user_id])
+        reason_text = ", ".join(reasons[:MAX_LINKED_REASONS]) or "no reasons recorded"
+        if len(reasons) > MAX_LINKED_REASONS:
+            reason_text += f" +{len(reasons) - MAX_LINKED_REASONS} more"
+        line = f"• `{user_id}`: {reason_text}"
+        # Leaves room for the "…and N more" line
+        if length + len(line) + 1 > MAX_LINKED_SUMMARY - 40:
+            break
+        lines.append(line)
+        length += len(line) + 1
+        shown += 1
+    if len(accounts) > shown:
+        lines.append(f"…and {len(accounts) - shown} more")
+    return "\n".join(lines)
+
+
+def avoid_options(guild_id, username):
+    """The catalog options for reasons the user was actually punished for; the whole catalog if unknown."""
+    options = catalog.select_options()
+    if not ip_index.loaded:
+        return options
+    previous = ip_index.reasons_for(guild_id, username)
+    return [option for option in options if option.value in previous]
+
+
 @bot.tree.command(name="avoid", description="Re-ban a user who is avoiding ban.")
-@app_commands.describe(username="Username of the user to ban", ip="IPv4 address of the user")
+@app_commands.describe(
+    username="Username of the user to ban",
+    ip="IPv4 address of the user",
+    network="IP range to search for linked accounts, e.g. 203.0.113.0/24 (defaults to the exact IP)"
+)
+@app_commands.autocomplete(username=complete_username, ip=complete_ip)
 @in_mod_channel()
-async def avoid(interaction: discord.Interaction, username: str, ip: str):
+@metrics.timed("command.avoid")
+async def avoid(interaction: discord.Interaction, username: str, ip: str, network: str | None = None):
     try:
         await interaction.response.defer(ephemeral=True)
         print(f"[avoid] Interaction deferred successfully for {username} @ {ip}")
@@ -420,16 +930,29 @@ async def avoid(interaction: discord.Interaction, username: str, ip: str):
         print(f"[avoid] ⚠️ Interaction already responded to for {username} @ {ip}")
         return
     except discord.errors.NotFound:
+        metrics.inc("interactions_expired_total", command="avoid")
         print(f"[avoid] ⚠️ Interaction expired or unknown for {username} @ {ip}")
         return
 
-    punishment_options = get_all_punishment_options()
-    print(f"[avoid] Fetched punishment options: {len(punishment_options)} found")
+    await catalog.ensure_loaded()
+    print(f"[avoid] Using cached punishment options: {len(catalog.options)} reasons")
 
-    if punishment_options:
-        view = PunishmentAvoidView(punishment_options, username, ip)
-        message = await interaction.followup.send(content="", view=view, ephemeral=True)
-        view.message = message
+    linked = linked_accounts_summary(interaction.guild_id, username, network or ip)
+    options = avoid_options(interaction.guild_id, username)
+    if options:
+        try:
+            view = PunishmentAvoidView(options, username, ip)
+        except ValueError as e:
+            await interaction.followup.send(f"⚠️ Cannot open the menu: {e}.", ephemeral=True)
+            return
+        reasons = [option.value for option in options]
+        pending = prefetcher.start("avoid", (interaction.guild_id, username),
+                                   lambda: get_latest_punishments(interaction.guild_id, username, reasons))
+        message = await interaction.followup.send(content=linked, view=view, ephemeral=True)
+        live_menus.add(message.id, view)
+        run_in_background(show_avoid_preview(view, message, pending))
+    elif catalog.options:
+        await interaction.followup.send(f"No previous punishments found for `{username}`.\n{linked}", ephemeral=True)
     else:
         await interaction.followup.send("No punishment templates found.", ephemeral=True)
 
@@ -439,11 +962,378 @@ async def avoid_error(interaction: discord.Interaction, error: AppCommandError):
     if isinstance(error, CheckFailure):
         # the channel gate failed
         await interaction.response.send_message(
-            "❌ This command can only be used in <#{}>.".format(ADMIN_BOT_CHANNEL_ID),
+            mod_channel_message(interaction),
             ephemeral=True
         )
     else:
         # re‑raise or log other kinds of errors
         raise error
 
-bot.run(DISCORD_TOKEN)
+
+def parse_bulk_bans(text):
+    """Parses `username,ip,reason[,reason...]` rows and checks every reason against the catalog.
+
+    Returns (bans, failures) where failures are (row number, username, message) tuples.
+    """
+    bans = []
+    failures = []
+    seen_usernames = set()
+
+    for row_number, row in enumerate(csv.reader(io.StringIO(text)), start=1):
+        cells = [cell.strip() for cell in row]
+        if not any(cells):
+            continue
+        if row_number == 1 and cells[0].lower() == "username":  # header
+            continue
+
+        username, ip, reasons = cells[0], cells[1] if len(cells) > 1 else "", [c for c in cells[2:] if c]
+        if not username or not ip or not reasons:
+            failures.append((row_number, username, "expected `username,ip,reason[,reason...]`"))
+            continue
+
+        if address_key(ip) is None:  # it goes into the admin command as is
+            failures.append((row_number, username, f"`{ip}` is not an IP address"))
+            continue
+
+        unknown = [reason for reason in reasons if catalog.value_for(reason) is None]
+        if unknown:
+            failures.append((row_number, username, f"unknown reason(s): {', '.join(unknown)}"))
+            continue
+
+        if username in seen_usernames:
+            failures.append((row_number, username, "duplicate username, put all of a user's reasons on one row"))
+            continue
+        seen_usernames.add(username)
+
+        values = list(dict.fromkeys(catalog.value_for(reason) for reason in reasons))
+        bans.append({"row": row_number, "username": username, "ip": ip, "reasons": values})
+
+    return bans, failures
+
+
+@bot.tree.command(name="banip-bulk", description="Ban many users at once from a CSV attachment.")
+@app_commands.describe(file="CSV with one username,ip,reason[,reason...] row per user")
+@in_mod_channel()
+@metrics.timed("command.banip-bulk")
+async def banip_bulk(interaction: discord.Interaction, file: discord.Attachment):
+    try:
+        await interaction.response.defer(ephemeral=True)
+    except discord.errors.NotFound:
+        metrics.inc("interactions_expired_total", command="banip-bulk")
+        print(f"[banip-bulk] ⚠️ Interaction expired or unknown for {file.filename}")
+        return
+
+    await catalog.ensure_loaded()
+    try:
+        text = (await file.read()).decode("utf-8-sig")
+    except (discord.HTTPException, UnicodeDecodeError) as e:
+        await interaction.followup.send(f"❌ Could not read `{file.filename}`: {e}", ephemeral=True)
+        return
+
+    settings = guild_settings.get(interaction.guild_id)
+    bans, failures = parse_bulk_bans(text)
+    print(f"[banip-bulk] Parsed {len(bans)} valid row(s), {len(failures)} invalid from {file.filename}")
+
+    # The users stay locked from the stage read to the write, so no other ban of them interleaves.
+    # Writes only go to the local outbox, so the locks are released long before any Discord call.
+    usernames = [ban["username"] for ban in bans]
+    recorded = []
+    async with user_locks.hold_many((settings.guild_id, username) for username in usernames):
+        # One query each for every user's stages and decayed totals
+        now = datetime.now(ZoneInfo("America/New_York"))
+        reasons = {reason for ban in bans for reason in ban["reasons"]}
+        stages, decayed = await asyncio.gather(
+            get_stages_for_users(settings.guild_id, usernames, reasons),
+            get_decayed_points_many(settings.guild_id, usernames, now),
+        )
+
+        plans = []
+        for ban in bans:
+            try:
+                plan = plan_ban(settings.guild_id, ban["username"], ban["ip"], ban["reasons"],
+                                stages[ban["username"]], decayed[ban["username"]])
+            except MissingTemplateError as e:
+                failures.append((ban["row"], ban["username"], str(e)))
+                continue
+            plans.append((ban["row"], plan))
+
+        # Every accepted row is one outbox entry, replayed as one atomic record_ban call
+        try:
+            result = await record_ban(
+                [row for _, plan in plans for row in plan["punishment_rows"]],
+                [row for _, plan in plans for row in plan["infraction_rows"]],
+                key=f"bulk:{interaction.id}",
+            ) if plans else []
+        except Exception as e:
+            print(f"[banip-bulk] ❌ Failed to record {len(plans)} ban(s): {e}")
+            failures.extend((row_number, plan["username"], f"write failed: {e}") for row_number, plan in plans)
+        else:
+            if result is None:
+                failures.extend((row_number, plan["username"], "already recorded") for row_number, plan in plans)
+            else:
+                for _, plan in plans:
+                    recorded.append(plan)
+                    prefetcher.invalidate((settings.guild_id, plan["username"]))
+                    index_written_rows(plan["punishment_rows"])
+
+    # Admin commands go out as one ordered stream, thread posts after them
+    for plan in recorded:
+        queue_admin_command(settings, plan)
+    forum_channel = await dispatcher.channel(settings.thread_channel_id)
+    for plan in recorded:
+        queue_ban_thread_post(settings, forum_channel, plan, interaction.user)
+
+    failures.sort()
+    summary = f"🔨 Bulk ban: **{len(recorded)}** of **{len(recorded) + len(failures)}** row(s) banned."
+    failure_lines = "\n".join(f"Row {row_number} `{username}`: {message}" for row_number, username, message in failures)
+
+    if not failures:
+        await interaction.followup.send(summary, ephemeral=True)
+    elif len(summary) + len(failure_lines) < 1900:
+        await interaction.followup.send(f"{summary}\n\n**Failed rows:**\n{failure_lines}", ephemeral=True)
+    else:
+        report = discord.File(io.BytesIO(failure_lines.encode()), filename="failed_rows.txt")
+        await interaction.followup.send(f"{summary} Failed rows are attached.", file=report, ephemeral=True)
+
+@banip_bulk.error
+async def banip_bulk_error(interaction: discord.Interaction, error: AppCommandError):
+    """Runs only if banip-bulk raised an exception *before* it replied."""
+    if isinstance(error, CheckFailure):
+        await interaction.response.send_message(
+            mod_channel_message(interaction),
+            ephemeral=True
+        )
+    else:
+        raise error
+
+
+@bot.tree.command(name="topoffenders", description="Show the users with the highest decayed point totals.")
+@app_commands.describe(limit="How many users to show (default 10)")
+@in_mod_channel()
+@metrics.timed("command.topoffenders")
+async def topoffenders(interaction: discord.Interaction, limit: app_commands.Range[int, 1, 25] = 10):
+    await interaction.response.defer(ephemeral=True)
+
+    decay_factor, decay_period = guild_settings.decay(interaction.guild_id)
+    rows = await fetch_all_infractions(interaction.guild_id)
+
+    def rank():
+        columns = InfractionColumns.from_rows(rows)
+        return columns, decayed_totals(columns, datetime.now(ZoneInfo("America/New_York")),
+                                       decay_factor=decay_factor, decay_period=decay_period)
+
+    # A few hundred milliseconds on a large guild; kept off the event loop so the heartbeat keeps going.
+    columns, totals = await asyncio.get_running_loop().run_in_executor(None, rank)
+    ranked = sorted(((points, user_id) for user_id, points in totals.items() if points > 0), reverse=True)
+
+    if not ranked:
+        await interaction.followup.send("No users currently have points.", ephemeral=True)
+        return
+
+    lines = [
+        f"**{position}.** `{user_id}` — {points} pts (x{ban_multiplier(points):.2f})"
+        for position, (points, user_id) in enumerate(ranked[:limit], start=1)
+    ]
+    await interaction.followup.send(
+        f"🏆 **Top offenders** ({len(ranked)} users with points, {len(columns)} infractions)\n\n" + "\n".join(lines),
+        ephemeral=True
+    )
+
+@topoffenders.error
+async def topoffenders_error(interaction: discord.Interaction, error: AppCommandError):
+    """Runs only if topoffenders raised an exception *before* it replied."""
+    if isinstance(error, CheckFailure):
+        await interaction.response.send_message(
+            mod_channel_message(interaction),
+            ephemeral=True
+        )
+    else:
+        raise error
+
+
+def history_line(entry):
+    when = f"<t:{int(entry['at'].timestamp())}:d>"
+    pending = " ⏳" if entry.get("pending") else ""
+    if entry["kind"] == "punishment":
+        template = catalog.get(entry["reason"], entry["stage"]) if entry.get("stage") is not None else None
+        unit = template.get("unit", "days") if template else "days"
+        ip = f" · `{entry['ip']}`" if entry.get("ip") else ""
+        return f"🔨 {when} **{entry['reason']}** · stage {entry['stage']} · {entry['final_duration']} {unit}{ip}{pending}"
+    return f"➕ {when} **{entry['points']:g} pts** · {entry.get('context') or 'no context'} ({entry.get('source')}){pending}"
+
+
+class HistoryView(discord.ui.View):
+    """Pages through a user's history.
+
+    Only the page on screen is fetched and rendered. The keyset cursor of every page already
+    visited is kept, so Previous jumps straight back instead of re-walking the history.
+    """
+
+    def __init__(self, guild_id, username, decayed_points, page, next_cursor):
+        super().__init__(timeout=LIVE_MENUS_TTL_SECONDS)
+        self.guild_id = guild_id
+        self.username = username
+        self.decayed_points = decayed_points
+        self.cursors = [None]
+        self.page = page
+        self.next_cursor = next_cursor
+        self._update_buttons()
+
+    def _update_buttons(self):
+        self.previous_page.disabled = len(self.cursors) == 1
+        self.next_page.disabled = self.next_cursor is None
+
+    def embed(self):
+        lines = [history_line(entry) for entry in self.page] or ["No punishments or infractions recorded."]
+        embed = discord.Embed(
+            title=f"History of {self.username}",
+            description=(
+                f"**Decayed Total:** {self.decayed_points}  |  "
+                f"**Multiplier:** x{ban_multiplier(self.decayed_points):.2f}\n\n" + "\n".join(lines)
+            )
+        )
+        embed.set_footer(text=f"Page {len(self.cursors)} · newest first")
+        return embed
+
+    async def _show(self, interaction, cursor):
+        self.page, self.next_cursor = await fetch_history_page(self.guild_id, self.username, cursor, HISTORY_PAGE_SIZE)
+        self._update_buttons()
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.cursors.pop()
+        await self._show(interaction, self.cursors[-1])
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.cursors.append(self.next_cursor)
+        await self._show(interaction, self.next_cursor)
+
+
+@bot.tree.command(name="history", description="Show a user's punishments and infractions, newest first.")
+@app_commands.describe(username="Username of the user to look up")
+@app_commands.autocomplete(username=complete_username)
+@in_mod_channel()
+@metrics.timed("command.history")
+async def history(interaction: discord.Interaction, username: str):
+    await interaction.response.defer(ephemeral=True)
+
+    now = datetime.now(ZoneInfo("America/New_York"))
+    (page, next_cursor), decayed_points = await asyncio.gather(
+        fetch_history_page(interaction.guild_id, username, None, HISTORY_PAGE_SIZE),
+        get_decayed_points(interaction.guild_id, username, now),
+    )
+    view = HistoryView(interaction.guild_id, username, decayed_points, page, next_cursor)
+    await interaction.followup.send(embed=view.embed(), view=view, ephemeral=True)
+
+@history.error
+async def history_error(interaction: discord.Interaction, error: AppCommandError):
+    """Runs only if history raised an exception *before* it replied."""
+    if isinstance(error, CheckFailure):
+        await interaction.response.send_message(
+            mod_channel_message(interaction),
+            ephemeral=True
+        )
+    else:
+        raise error
+
+
+CHANNEL_ID_PATTERN = re.compile(r"\d{15,20}")
+
+
+@bot.tree.command(name="configure", description="Set this server's punishment forum, command channels and decay.")
+@app_commands.describe(
+    forum="Forum channel that gets one punishment thread per user",
+    admin_channel="Channel for the moderation commands and the admin bot commands",
+    allowed_channels="Other channels the moderation commands may be used in, as #mentions (replaces the current list)",
+    decay_factor="Share of a user's points left after each decay period (default 0.95)",
+    decay_period_days="Length of one decay period in days (default 60)"
+)
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.checks.has_permissions(manage_guild=True)
+@metrics.timed("command.configure")
+async def configure(
+    interaction: discord.Interaction,
+    forum: discord.ForumChannel,
+    admin_channel: discord.TextChannel,
+    allowed_channels: str | None = None,
+    decay_factor: app_commands.Range[float, 0.01, 1.0] | None = None,
+    decay_period_days: app_commands.Range[float, 1.0, 3650.0] | None = None
+):
+    await interaction.response.defer(ephemeral=True)
+
+    previous = guild_settings.get(interaction.guild_id)
+    current = previous or GuildSettings(interaction.guild_id, forum.id, admin_channel.id)
+    settings = GuildSettings(
+        interaction.guild_id,
+        forum.id,
+        admin_channel.id,
+        (int(channel_id) for channel_id in CHANNEL_ID_PATTERN.findall(allowed_channels))
+        if allowed_channels is not None else current.allowed_channel_ids,
+        decay_factor if decay_factor is not None else current.decay_factor,
+        decay_period_days * 86_400 if decay_period_days is not None else current.decay_period,
+    )
+    try:
+        await save_guild_settings(settings.to_row())
+    except Exception as e:
+        print(f"[configure] ❌ Failed to save settings of guild {interaction.guild_id}: {e}")
+        await interaction.followup.send(f"❌ Failed to save the settings: {e}", ephemeral=True)
+        return
+
+    guild_settings.put(settings)
+    if previous is None or previous.thread_channel_id != forum.id:
+        run_in_background(warm_thread_index(settings))
+
+    channels = ", ".join(f"<#{channel_id}>" for channel_id in sorted(settings.command_channel_ids))
+    await interaction.followup.send(
+        f"🏰 Settings saved.\n"
+        f"**Punishment forum:** {forum.mention}\n"
+        f"**Command channels:** {channels}\n"
+        f"**Decay:** x{settings.decay_factor:g} every {settings.decay_period / 86_400:g} days",
+        ephemeral=True
+    )
+
+@configure.error
+async def configure_error(interaction: discord.Interaction, error: AppCommandError):
+    """Runs only if configure raised an exception *before* it replied."""
+    if isinstance(error, CheckFailure):
+        await interaction.response.send_message(
+            "❌ You need the Manage Server permission to configure Hammer.",
+            ephemeral=True
+        )
+    else:
+        raise error
+
+
+@bot.tree.command(name="reloadcatalog", description="Reload the punishment catalog from the database.")
+@in_mod_channel()
+@metrics.timed("command.reloadcatalog")
+async def reloadcatalog(interaction: discord.Interaction):
+    await interaction.response.defer(ephemeral=True)
+    try:
+        await catalog.reload()
+    except Exception as e:
+        print(f"[reloadcatalog] ❌ Failed to reload catalog: {e}")
+        await interaction.followup.send(f"❌ Failed to reload catalog: {e}", ephemeral=True)
+        return
+
+    await interaction.followup.send(
+        f"📚 Catalog reloaded: {len(catalog.rows)} entries across {len(catalog.options)} reasons.",
+        ephemeral=True
+    )
+
+@reloadcatalog.error
+async def reloadcatalog_error(interaction: discord.Interaction, error: AppCommandError):
+    """Runs only if reloadcatalog raised an exception *before* it replied."""
+    if isinstance(error, CheckFailure):
+        await interaction.response.send_message(
+            mod_channel_message(interaction),
+            ephemeral=True
+        )
+    else:
+        raise error
+
+if __name__ == "__main__":
+    bot.run(DISCORD_TOKEN)
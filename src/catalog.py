@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import discord
+
+from config import CATALOG_TTL_SECONDS
+from db import get_all_punishment_options
+from metrics import metrics
+
+MAX_LENGTH = 100
+
+
+class PunishmentCatalog:
+    """Process-wide copy of the `catalog` table.
+
+    The table almost never changes, so it is loaded once at startup and indexed by
+    (reason, stage). Lookups never touch the network; a stale copy keeps serving while
+    a refresh runs in the background, and `/reloadcatalog` forces one immediately.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.rows: list[dict] = []
+        self.options: list[discord.SelectOption] = []
+        self._by_key: dict[tuple[str, int], dict] = {}
+        self._by_value: dict[str, str] = {}
+        self._loaded_at: float | None = None
+        self._lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    @property
+    def stale(self) -> bool:
+        return not self.loaded or time.monotonic() - self._loaded_at > self.ttl
+
+    async def reload(self):
+        async with self._lock:
+            rows = await get_all_punishment_options() or []
+            self._build(rows)
+        print(f"📚 Loaded punishment catalog: {len(self.rows)} entries, {len(self.options)} reasons")
+        return self.rows
+
+    async def ensure_loaded(self):
+        """Loads the catalog if it never was, otherwise refreshes it in the background when stale."""
+        if not self.loaded:
+            await self.reload()
+        elif self.stale and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self.reload())
+
+    def _build(self, rows):
+        by_key = {}
+        by_value = {}
+        options = []
+        seen_reasons = set()
+
+        for row in rows:
+            reason = row["reason"]
+            by_key[(reason, int(row["stage"]))] = row
+            if reason in seen_reasons:
+                continue
+            seen_reasons.add(reason)
+
+            label = reason[:90] + "..." if len(reason) > MAX_LENGTH else reason
+            value = reason[:MAX_LENGTH]
+            by_value[value] = reason
+            options.append(discord.SelectOption(label=label, value=value))
+
+        self.rows = rows
+        self.options = options
+        self._by_key = by_key
+        self._by_value = by_value
+        self._loaded_at = time.monotonic()
+
+    def reason_for(self, value: str) -> str:
+        """Maps a select-menu value (truncated to 100 chars) back to the full reason."""
+        return self._by_value.get(value, value)
+
+    def value_for(self, reason) -> str | None:
+        """Returns the select-menu value for a full or truncated reason, or None if it is not in the catalog."""
+        value = reason[:MAX_LENGTH]
+        return value if value in self._by_value else None
+
+    def get(self, reason, stage):
+        row = self._by_key.get((self.reason_for(reason), int(stage)))
+        metrics.inc("cache_lookups_total", cache="catalog", result="hit" if row else "miss")
+        return row
+
+    def select_options(self) -> list[discord.SelectOption]:
+        # Each Select owns its options, so hand out copies of the prebuilt list.
+        return [discord.SelectOption(label=o.label, value=o.value) for o in self.options]
+
+
+catalog = PunishmentCatalog(CATALOG_TTL_SECONDS)
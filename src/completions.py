@@ -0,0 +1,70 @@
+from bisect import bisect_left, insort
+
+from metrics import metrics
+
+MAX_CHOICES = 25  # Discord's limit for autocomplete results
+
+
+class PrefixIndex:
+    """Case-insensitive prefix search over each guild's set of strings, as a sorted list and bisect.
+
+    Autocomplete has to answer within Discord's three-second budget on every keystroke, so
+    lookups never leave the process: a prefix query is one binary search and a slice. Keys are
+    (guild_id, folded value) pairs, so every guild's values form one contiguous run of the list
+    and a guild never sees another's.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._keys: list[tuple[int, str]] = []
+        self._display: dict[tuple[int, str], str] = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def load(self, values):
+        """Rebuilds the index from (guild_id, value) pairs."""
+        display = {}
+        for guild_id, value in values:
+            if value:
+                display.setdefault((guild_id, value.casefold()), value)
+        self._display = display
+        self._keys = sorted(display)
+
+    def add(self, guild_id, value):
+        if not value:
+            return
+        key = (guild_id, value.casefold())
+        if key not in self._display:
+            self._display[key] = value
+            insort(self._keys, key)
+
+    def complete(self, guild_id, prefix, limit=MAX_CHOICES) -> list[str]:
+        with metrics.span(f"autocomplete.{self.name}"):
+            prefix = prefix.strip().casefold()
+            start = bisect_left(self._keys, (guild_id, prefix))
+            matches = []
+            for key in self._keys[start:start + limit]:
+                if key[0] != guild_id or not key[1].startswith(prefix):
+                    break
+                matches.append(self._display[key])
+            return matches
+
+
+usernames = PrefixIndex("username")
+ips = PrefixIndex("ip")
+
+
+def load_completions(punishments, scored_users):
+    """Fills both indexes from `{'guild_id', 'user_id', 'ip'}` punishment rows and `{'guild_id', 'user_id'}` score rows."""
+    usernames.load((row['guild_id'], row['user_id']) for row in [*punishments, *scored_users])
+    ips.load((row['guild_id'], row['ip'].strip()) for row in punishments if row.get('ip'))
+    print(f"🔤 Autocomplete ready: {len(usernames)} usernames, {len(ips)} IPs")
+
+
+def add_completions(rows):
+    """Adds the usernames and IPs of freshly written punishment or infraction rows."""
+    for row in rows:
+        usernames.add(row['guild_id'], row['user_id'])
+        if row.get('ip'):
+            ips.add(row['guild_id'], row['ip'].strip())
@@ -8,6 +8,22 @@ load_dotenv()
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 SUPABASE_URL=os.getenv("SUPABASE_URL")
 SUPABASE_KEY=os.getenv("SUPABASE_KEY")
-THREAD_CHANNEL_ID=int(os.getenv("THREAD_CHANNEL_ID"))
-ADMIN_BOT_CHANNEL_ID=int(os.getenv("ADMIN_BOT_CHANNEL_ID"))
-GUILD_ID=int(os.getenv("GUILD_ID"))
\ No newline at end of file
+THREAD_CHANNEL_ID=int(os.getenv("THREAD_CHANNEL_ID", "0"))
+ADMIN_BOT_CHANNEL_ID=int(os.getenv("ADMIN_BOT_CHANNEL_ID", "0"))
+GUILD_ID=int(os.getenv("GUILD_ID", "0"))
+DB_MAX_WORKERS=int(os.getenv("DB_MAX_WORKERS", "8"))
+CATALOG_TTL_SECONDS=int(os.getenv("CATALOG_TTL_SECONDS", "3600"))
+PREFETCH_TTL_SECONDS=int(os.getenv("PREFETCH_TTL_SECONDS", "300"))
+METRICS_HOST=os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT=int(os.getenv("METRICS_PORT", "9108"))
+METRICS_JSONL=os.getenv("METRICS_JSONL")
+OUTBOX_PATH=os.getenv("OUTBOX_PATH", "outbox.sqlite3")
+STORAGE_BACKEND=os.getenv("STORAGE_BACKEND", "supabase")
+SQLITE_PATH=os.getenv("SQLITE_PATH", "hammer.sqlite3")
+COMMAND_SYNC_STATE_PATH=os.getenv("COMMAND_SYNC_STATE_PATH", ".command_sync.json")
+LIVE_MENUS_MAX=int(os.getenv("LIVE_MENUS_MAX", "256"))
+LIVE_MENUS_TTL_SECONDS=int(os.getenv("LIVE_MENUS_TTL_SECONDS", "900"))
+HISTORY_PAGE_SIZE=int(os.getenv("HISTORY_PAGE_SIZE", "10"))
+COMPACTION_INTERVAL_SECONDS=int(os.getenv("COMPACTION_INTERVAL_SECONDS", "21600"))
+COMPACTION_EPSILON=float(os.getenv("COMPACTION_EPSILON", "0.25"))
+COMPACTION_BATCH_USERS=int(os.getenv("COMPACTION_BATCH_USERS", "500"))
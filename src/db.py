@@ -1,15 +1,42 @@
-from supabase import create_client
-from config import SUPABASE_URL, SUPABASE_KEY
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+from config import STORAGE_BACKEND, SQLITE_PATH, SUPABASE_URL, SUPABASE_KEY, DB_MAX_WORKERS, OUTBOX_PATH, GUILD_ID
 from dateutil import parser
+from guilds import guild_settings, DECAY_FACTOR, DECAY_PERIOD
+from outbox import Outbox
+from storage import create_backend
 
-supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+TEST_DECAY_PERIOD = 15
+
+backend = create_backend(
+    STORAGE_BACKEND,
+    url=SUPABASE_URL,
+    key=SUPABASE_KEY,
+    max_workers=DB_MAX_WORKERS,
+    path=SQLITE_PATH,
+    decay_factor=DECAY_FACTOR,
+    decay_period=DECAY_PERIOD,
+    home_guild_id=GUILD_ID,
+)
+
+
+async def warm_up():
+    """Creates the storage client ahead of the first query; safe to run alongside the gateway connect."""
+    await backend.warm()
 
-def add_punishment(user_id, ip, reason, base_days, points, multiplier, total_pts_at_ban, *, explicit_stage: int | None = None):
-    stage = (explicit_stage
-             if explicit_stage is not None
-             else get_user_stage(user_id, reason))
 
-    data = {
+async def fetch_guild_settings():
+    return await backend.get_guild_settings()
+
+async def save_guild_settings(row):
+    await backend.save_guild_settings(row)
+
+
+def punishment_row(guild_id, user_id, ip, reason, base_days, points, multiplier, total_pts_at_ban, stage):
+    return {
+        'guild_id': guild_id,
         'user_id': user_id,
         'ip': ip,
         'reason': reason,
@@ -20,92 +47,241 @@ def add_punishment(user_id, ip, reason, base_days, points, multiplier, total_pts
         'stage': stage,
         'total_points_at_ban': total_pts_at_ban,
     }
-    supabase_client.from_('punishments').insert(data).execute()
 
-def log_infraction(user_id, points, context, source='automated'):
-    data = {
+def infraction_row(guild_id, user_id, points, context, source='automated'):
+    return {
+        'guild_id': guild_id,
         'user_id': user_id,
         'points': float(points),
         'context': context,
         'source': source
     }
-    supabase_client.from_('infractions').insert(data).execute()
 
-def get_user_stage(user_id, reason):
-    response = supabase_client.from_('punishments').select('stage') \
-        .eq('user_id', user_id) \
-        .eq('reason', reason) \
-        .order('stage', desc=True) \
-        .limit(1) \
-        .execute()
+async def _replay(key, punishments, infractions, created_at):
+    # Writes queued before multi-guild support carry no guild_id; they belong to the home guild.
+    punishments = [{'guild_id': GUILD_ID, **row} for row in punishments]
+    infractions = [{'guild_id': GUILD_ID, **row} for row in infractions]
+    # Stamped with when the ban was recorded locally, not when the replay lands.
+    recorded_at = datetime.fromtimestamp(created_at, timezone.utc)
+    # Looked up on every call so a backend swapped in later (the bench does) receives the replay.
+    return await backend.record_ban(key, punishments, infractions, recorded_at)
+
+# Like _replay, asks whichever backend is current.
+outbox = Outbox(OUTBOX_PATH, _replay, is_transient=lambda error: backend.is_transient(error))
+
+async def record_ban(punishments, infractions=(), *, key=None):
+    """Records all punishment and infraction rows of one action.
 
-    if response.data and response.data[0]['stage'] is not None:
-        return int(response.data[0]['stage']) + 1
-    else:
-        return 1
+    The rows are committed to the local outbox and replayed to the backend in the background, so
+    this returns as soon as the write is durable locally. Returns the recorded punishment rows, or
+    None if `key` was recorded before: a repeated submission of the same action writes nothing.
+    """
+    key = key or uuid.uuid4().hex
+    entry = await outbox.append(key, punishments, infractions)
+    if entry is None:
+        return None
+    return [{**row, 'write_key': key} for row in entry['punishments']]
 
-def get_user_points(user_id):
-    result = supabase_client.from_('infractions').select('points').eq('user_id', user_id).execute()
-    return sum(entry['points'] for entry in result.data) if result.data else 0
+async def was_recorded(key):
+    """Whether a write with this idempotency key was already recorded; answered locally."""
+    return await outbox.contains(key)
 
+async def add_punishment(guild_id, user_id, ip, reason, base_days, points, multiplier, total_pts_at_ban, *, explicit_stage: int | None = None):
+    stage = (explicit_stage
+             if explicit_stage is not None
+             else await get_user_stage(guild_id, user_id, reason))
+
+    # Goes through record_ban like every other write, so it is queued, keyed and merged into reads.
+    await record_ban([punishment_row(guild_id, user_id, ip, reason, base_days, points, multiplier, total_pts_at_ban, stage)])
+
+async def log_infraction(guild_id, user_id, points, context, source='automated'):
+    # Goes through record_ban so the user's score rollup is advanced in the same transaction.
+    await record_ban([], [infraction_row(guild_id, user_id, points, context, source)])
+
+async def get_user_stage(guild_id, user_id, reason):
+    stages = await get_user_stages(guild_id, user_id, [reason])
+    return stages[reason]
+
+async def get_user_stages(guild_id, user_id, reasons):
+    """Returns the next stage for every reason in one round-trip, as {reason: stage}."""
+    stages = await get_stages_for_users(guild_id, [user_id], reasons)
+    return stages[user_id]
 
-def fetch_user_infractions(user_id):
-    response = supabase_client.from_('infractions').select('*').eq('user_id', user_id).execute()
-    if not response.data:
-        return []
+async def get_stages_for_users(guild_id, user_ids, reasons):
+    """Returns the next stage of every reason for every user in one round-trip, as {user_id: {reason: stage}}."""
+    user_ids = list(dict.fromkeys(user_ids))
+    reasons = list(dict.fromkeys(reasons))
+    stages = {user_id: {reason: 1 for reason in reasons} for user_id in user_ids}
+    if not user_ids or not reasons:
+        return stages
+
+    # Taken before the read: a replay landing during it would leave its rows in neither otherwise.
+    # A row in both just counts twice towards the same max.
+    pending = outbox.pending_punishments(guild_id, user_ids)
+    rows = await backend.get_punishment_stages(guild_id, user_ids, reasons)
+    for row in [*rows, *pending]:
+        if row['stage'] is not None and row['reason'] in stages[row['user_id']]:
+            user_stages = stages[row['user_id']]
+            user_stages[row['reason']] = max(user_stages[row['reason']], int(row['stage']) + 1)
+    return stages
+
+async def get_user_points(guild_id, user_id):
+    infractions = await fetch_user_infractions(guild_id, user_id)
+    return sum(entry['points'] for entry in infractions)
+
+
+async def fetch_user_infractions(guild_id, user_id):
+    rows = await backend.get_infractions(guild_id, user_id)
+    pending = [{'points': row['points'], 'timestamp': row['timestamp']} for row in outbox.pending_infractions(guild_id, {user_id})]
 
     return [
         {
             'points': entry['points'],
             'timestamp': parser.isoparse(entry['timestamp'])
         }
-        for entry in response.data
+        for entry in rows
+    ] + pending
+
+async def fetch_all_infractions(guild_id, page_size=1000):
+    """Every infraction in the guild as `{'user_id', 'points', 'timestamp'}` rows, paged by id."""
+    rows = await backend.get_all_infractions(guild_id, page_size)
+    return rows + outbox.pending_infractions(guild_id)
+
+async def fetch_history_page(guild_id, user_id, cursor=None, limit=10):
+    """One page of the user's punishments and infractions, merged newest first.
+
+    `cursor` is None for the first page, otherwise the cursor returned with the previous page: a
+    `(time, id)` keyset position per table, so every page is two indexed queries however long the
+    history is. Returns (entries, next_cursor); next_cursor is None on the last page. Writes still
+    in the outbox head the first page.
+    """
+    cursor = cursor or {'punishments': None, 'infractions': None}
+    first_page = cursor['punishments'] is None and cursor['infractions'] is None
+    # Taken before the read, see get_stages_for_users; a write replayed during it is dropped below.
+    pending = list(outbox.pending) if first_page else []
+    punishments, infractions = await asyncio.gather(
+        backend.get_punishment_page(guild_id, user_id, cursor['punishments'], limit + 1),
+        backend.get_infraction_page(guild_id, user_id, cursor['infractions'], limit + 1),
+    )
+
+    rows = [
+        *({'kind': 'punishment', 'time': row['created_at'], **row} for row in punishments),
+        *({'kind': 'infraction', 'time': row['timestamp'], **row} for row in infractions),
     ]
+    for row in rows:
+        row['at'] = parser.isoparse(row['time'])
+    rows.sort(key=lambda row: (row['at'], row['id']), reverse=True)
+    page = rows[:limit]
+
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = dict(cursor)
+        for row in page:  # the last row shown from each table is where that table resumes
+            next_cursor[row['kind'] + 's'] = (row['time'], row['id'])
 
-def calculate_total_decayed_points(infractions, current_time, test_mode=False):
-    DECAY_PERIOD = 15 if test_mode else 60 * 60 * 24 * 60  # 15s for testing, 60d in prod
-    DECAY_FACTOR = 0.95
+    # The two pages are separate reads, so a replay can land in one table and not yet the other.
+    replayed = {(row['kind'], row['write_key']) for row in rows}
+    pending_rows = [
+        {'kind': 'punishment', 'pending': True, 'at': datetime.fromtimestamp(entry['created_at'], timezone.utc), **row}
+        for entry in pending if ('punishment', entry['key']) not in replayed
+        for row in entry['punishments']
+        if row.get('guild_id') == guild_id and row['user_id'] == user_id
+    ] + [
+        {'kind': 'infraction', 'pending': True, 'at': at, **row, 'timestamp': at}
+        for entry in pending if ('infraction', entry['key']) not in replayed
+        for at in [datetime.fromtimestamp(entry['created_at'], timezone.utc)]
+        for row in entry['infractions']
+        if row.get('guild_id') == guild_id and row['user_id'] == user_id
+    ]
+    page = sorted(pending_rows, key=lambda row: row['at'], reverse=True) + page
+    return page, next_cursor
+
+async def compact_infractions(epsilon, max_users=500):
+    """Folds infractions that have decayed below `epsilon` points into per-user summary rows.
+
+    Each summary is worth exactly what the rows it replaces were worth at compaction time, and
+    the originals move to infractions_archive. Stages come from punishments and decayed totals
+    from user_scores, neither of which is touched. Returns `{'users', 'archived'}` counts.
+    """
+    return await backend.compact_infractions(epsilon, max_users)
+
+def calculate_total_decayed_points(infractions, current_time, test_mode=False, *, decay_factor=DECAY_FACTOR, decay_period=DECAY_PERIOD):
+    period = TEST_DECAY_PERIOD if test_mode else decay_period  # 15s for testing, 60d in prod
 
     total = 0.0
     for entry in infractions:
         age_seconds = (current_time - entry['timestamp']).total_seconds()
-        decay_periods = int(age_seconds // DECAY_PERIOD)
-        decayed = entry['points'] * (DECAY_FACTOR ** decay_periods)
+        decay_periods = int(age_seconds // period)
+        decayed = entry['points'] * (decay_factor ** decay_periods)
         total += decayed
     return round(total, 2)
 
-def get_all_punishment_options():
-    result = supabase_client.from_('catalog').select('*').order('stage', desc=False).execute()
-    return result.data
-
-def get_catalog_punishment(reason, stage):
-    result = (
-        supabase_client
-        .from_('catalog')
-        .select('*')
-        .eq('reason', reason)
-        .eq('stage', stage)
-        .limit(1)
-        .execute()
-    )
-    if result.data and len(result.data) > 0:
-        return result.data[0]
-    return None
-
-def get_latest_punishment(username, reason):
-    result = (
-        supabase_client
-        .from_('punishments')
-        .select('*')
-        .eq('user_id', username)
-        .eq('reason', reason)
-        .order('created_at', desc=True)
-        .limit(1)
-        .execute()
-    )
-    return result.data[0] if result.data else None
+def decay_score(score, checkpoint, current_time, decay_factor=DECAY_FACTOR, decay_period=DECAY_PERIOD):
+    """Closed-form decay of a rollup score from its checkpoint to current_time."""
+    elapsed = max((current_time - checkpoint).total_seconds(), 0)
+    return score * decay_factor ** (elapsed / decay_period)
+
+async def get_decayed_points(guild_id, user_id, current_time):
+    """Reads the user's score rollup (kept up to date by record_ban) in one primary-key lookup."""
+    points = await get_decayed_points_many(guild_id, [user_id], current_time)
+    return points[user_id]
+
+async def get_decayed_points_many(guild_id, user_ids, current_time):
+    """Decayed totals for several users from one user_scores lookup, as {user_id: points}."""
+    user_ids = list(dict.fromkeys(user_ids))
+    points = {user_id: 0.0 for user_id in user_ids}
+    if not user_ids:
+        return points
+
+    decay = guild_settings.decay(guild_id)
+    pending = outbox.pending_infractions(guild_id, set(user_ids))  # before the read, see get_stages_for_users
+    checkpoints = {}
+    for row in await backend.get_user_scores(guild_id, user_ids):
+        checkpoints[row['user_id']] = checkpoint = parser.isoparse(row['checkpoint'])
+        points[row['user_id']] = decay_score(row['score'], checkpoint, current_time, *decay)
+    for row in pending:
+        # The checkpoint is the recorded time of the last write replayed into the score, and the
+        # outbox replays in order, so a row recorded no later than it is already counted.
+        checkpoint = checkpoints.get(row['user_id'])
+        if checkpoint is None or row['timestamp'] > checkpoint:
+            points[row['user_id']] += decay_score(row['points'], row['timestamp'], current_time, *decay)
+    return {user_id: round(total, 2) for user_id, total in points.items()}
+
+async def get_all_punishment_options():
+    return await backend.get_catalog()
+
+async def get_catalog_punishment(reason, stage):
+    return await backend.get_catalog_punishment(reason, stage)
+
+async def get_latest_punishment(guild_id, username, reason):
+    latest = await get_latest_punishments(guild_id, username, [reason])
+    return latest.get(reason)
+
+async def get_latest_punishments(guild_id, username, reasons):
+    """Returns the latest punishment for each of the given reasons in one query, as {reason: row}."""
+    reasons = list(dict.fromkeys(reasons))
+    if not reasons:
+        return {}
+
+    pending = outbox.pending_punishments(guild_id, [username])  # before the read, see get_stages_for_users
+    latest = await backend.get_latest_punishments(guild_id, username, reasons)
+    for row in pending:  # not replayed yet (or just now), so at least as new as anything remote
+        if row['reason'] in latest or row['reason'] in reasons:
+            latest[row['reason']] = row
+    return latest
+
+async def fetch_punishment_index():
+    """`{'guild_id', 'user_id', 'ip', 'reason'}` for every recorded punishment in every guild, pending writes included."""
+    rows = await backend.get_punishment_index()
+    return rows + [row for entry in outbox.pending for row in entry['punishments'] if 'guild_id' in row]
+
+async def fetch_scored_users():
+    """`{'guild_id', 'user_id'}` of every user with an infraction, in every guild, pending writes included."""
+    rows = await backend.get_scored_users()
+    return rows + [
+        {'guild_id': row['guild_id'], 'user_id': row['user_id']}
+        for row in outbox.pending_infractions() if 'guild_id' in row
+    ]
 
-def get_previous_reasons_for_user(username):
-    rows = supabase_client.from_('punishments').select('reason').eq('username', username).execute()
-    reasons = list({r['reason'] for r in rows.data})
-    return reasons
\ No newline at end of file
+async def get_previous_reasons_for_user(guild_id, username):
+    return await backend.get_previous_reasons(guild_id, username)
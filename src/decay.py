@@ -0,0 +1,78 @@
+from datetime import datetime, timezone
+
+import numpy as np
+
+from db import DECAY_FACTOR, DECAY_PERIOD, TEST_DECAY_PERIOD
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECONDS = 1_000_000
+
+
+def _epoch_us(moment: datetime) -> int:
+    # Integer microseconds keep period boundaries exact, like timedelta arithmetic does.
+    delta = moment - _EPOCH
+    return (delta.days * 86_400 + delta.seconds) * _MICROSECONDS + delta.microseconds
+
+
+def _parse_epoch_us(values: list[str]) -> np.ndarray:
+    """Epoch microseconds of ISO-8601 strings, parsed by numpy in one call when they are all UTC."""
+    naive = []
+    for value in values:
+        if value.endswith('+00:00'):
+            naive.append(value[:-6])
+        elif value.endswith('Z'):
+            naive.append(value[:-1])
+        else:  # another offset; rare enough to parse one by one
+            return np.array([_epoch_us(datetime.fromisoformat(value)) for value in values], dtype=np.int64)
+    return np.array(naive, dtype='datetime64[us]').astype(np.int64)
+
+
+class InfractionColumns:
+    """Infractions of many users stored column-wise: user index, epoch microseconds and points."""
+
+    def __init__(self, user_ids: list[str], user_index: np.ndarray, timestamps: np.ndarray, points: np.ndarray):
+        self.user_ids = user_ids
+        self.user_index = user_index
+        self.timestamps = timestamps
+        self.points = points
+
+    def __len__(self):
+        return len(self.points)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Builds columns from `{'user_id', 'points', 'timestamp'}` rows; timestamps may be ISO strings or datetimes.
+
+        Tens of thousands of rows take a while, so callers on the event loop run this in an executor.
+        """
+        positions = {}
+        user_index = np.fromiter((positions.setdefault(row['user_id'], len(positions)) for row in rows), np.int64, len(rows))
+        points = np.fromiter((row['points'] for row in rows), np.float64, len(rows))
+
+        timestamps = np.empty(len(rows), dtype=np.int64)
+        strings = [i for i, row in enumerate(rows) if isinstance(row['timestamp'], str)]
+        if len(strings) < len(rows):  # pending outbox rows carry datetimes
+            for i, row in enumerate(rows):
+                if not isinstance(row['timestamp'], str):
+                    timestamps[i] = _epoch_us(row['timestamp'])
+        if strings:
+            timestamps[strings] = _parse_epoch_us([rows[i]['timestamp'] for i in strings])
+        user_ids = list(positions)
+        return cls(user_ids, user_index, timestamps, points)
+
+
+def decayed_totals(columns: InfractionColumns, current_time: datetime, test_mode=False, *,
+                   decay_factor=DECAY_FACTOR, decay_period=DECAY_PERIOD) -> dict[str, float]:
+    """Every user's decayed total in one vectorised pass.
+
+    Matches calculate_total_decayed_points for each user's infractions taken in the same order.
+    """
+    if not len(columns):
+        return {}
+
+    period = int((TEST_DECAY_PERIOD if test_mode else decay_period) * _MICROSECONDS)
+    decay_periods = (_epoch_us(current_time) - columns.timestamps) // period
+    decayed = columns.points * np.power(decay_factor, decay_periods.astype(np.float64))
+    totals = np.bincount(columns.user_index, weights=decayed, minlength=len(columns.user_ids))
+
+    return {user_id: round(float(total), 2) for user_id, total in zip(columns.user_ids, totals)}
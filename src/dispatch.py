@@ -0,0 +1,103 @@
+import asyncio
+
+import aiohttp
+import discord
+
+from metrics import metrics
+
+
+class Dispatcher:
+    """Sends outbound Discord messages from a single background worker.
+
+    Jobs run strictly in submission order, so admin commands and thread posts reach Discord in
+    the order bans were issued. discord.py already waits out per-route rate-limit buckets; on top
+    of that, rate limits that still surface, server errors and network failures are retried with
+    exponential backoff. Jobs that fail for good are reported to their guild's report channel
+    instead of being lost.
+    """
+
+    def __init__(self, client: discord.Client, *, max_attempts=5, base_delay=1.0, max_delay=60.0):
+        self.client = client
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._channels: dict[int, discord.abc.GuildChannel] = {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: asyncio.Task | None = None
+
+    async def channel(self, channel_id: int):
+        """Resolves a channel once and reuses the handle afterwards."""
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            channel = self.client.get_channel(channel_id) or await self.client.fetch_channel(channel_id)
+            self._channels[channel_id] = channel
+        return channel
+
+    def submit(self, label, action, *, report_channel_id: int) -> asyncio.Future:
+        """Queues `action` (a zero-argument coroutine function).
+
+        The returned future resolves to the action's result, or to None if it failed for good, in
+        which case the failure is posted to `report_channel_id`.
+        """
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((label, action, report_channel_id, future))
+        return future
+
+    def send(self, channel_id: int, content, *, label, report_channel_id: int) -> asyncio.Future:
+        async def action():
+            channel = await self.channel(channel_id)
+            return await channel.send(content)
+
+        return self.submit(label, action, report_channel_id=report_channel_id)
+
+    async def _run(self):
+        while True:
+            label, action, report_channel_id, future = await self._queue.get()
+            try:
+                with metrics.span("dispatch.job"):
+                    result = await self._attempt(label, action, report_channel_id)
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    async def _attempt(self, label, action, report_channel_id):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return await action()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None or attempt == self.max_attempts:
+                    metrics.inc("dispatch_failures_total")
+                    await self._report(label, e, attempt, report_channel_id)
+                    return None
+
+                metrics.inc("dispatch_retries_total")
+
+                print(f"⏳ {label} failed ({e}), retrying in {delay:.1f}s [{attempt}/{self.max_attempts}]")
+                await asyncio.sleep(delay)
+
+    def _retry_delay(self, error, attempt) -> float | None:
+        """Seconds to wait before retrying, or None if the error is permanent."""
+        backoff = min(self.base_delay * 2 ** (attempt - 1), self.max_delay)
+
+        if isinstance(error, discord.RateLimited):
+            return max(error.retry_after, backoff)
+        if isinstance(error, discord.HTTPException):
+            if error.status == 429 or error.status >= 500:
+                return backoff
+            return None
+        if isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, OSError)):
+            return backoff
+        return None
+
+    async def _report(self, label, error, attempts, report_channel_id):
+        print(f"❌ {label} failed permanently after {attempts} attempt(s): {error}")
+        try:
+            channel = await self.channel(report_channel_id)
+            await channel.send(f"❌ **{label}** failed after {attempts} attempt(s): `{error}`")
+        except Exception as e:
+            print(f"❌ Could not report dispatch failure: {e}")
@@ -0,0 +1,95 @@
+from config import GUILD_ID, THREAD_CHANNEL_ID, ADMIN_BOT_CHANNEL_ID
+
+DECAY_FACTOR = 0.95
+DECAY_PERIOD = 60 * 60 * 24 * 60  # 60 days
+
+
+class GuildSettings:
+    """One guild's channels and decay parameters, as stored in the `guild_settings` table."""
+
+    def __init__(self, guild_id: int, thread_channel_id: int, admin_channel_id: int, allowed_channel_ids=(),
+                 decay_factor: float = DECAY_FACTOR, decay_period: float = DECAY_PERIOD):
+        self.guild_id = guild_id
+        self.thread_channel_id = thread_channel_id
+        self.admin_channel_id = admin_channel_id
+        self.allowed_channel_ids = frozenset(allowed_channel_ids)
+        self.decay_factor = decay_factor
+        self.decay_period = decay_period
+
+    @property
+    def command_channel_ids(self) -> frozenset[int]:
+        """Where the moderation commands may be used: the admin channel and any extra allowed ones."""
+        return self.allowed_channel_ids | {self.admin_channel_id}
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            int(row['guild_id']),
+            int(row['thread_channel_id']),
+            int(row['admin_channel_id']),
+            (int(channel_id) for channel_id in row.get('allowed_channel_ids') or ()),
+            float(row['decay_factor']),
+            float(row['decay_period_seconds']),
+        )
+
+    def to_row(self):
+        return {
+            'guild_id': self.guild_id,
+            'thread_channel_id': self.thread_channel_id,
+            'admin_channel_id': self.admin_channel_id,
+            'allowed_channel_ids': sorted(self.allowed_channel_ids),
+            'decay_factor': self.decay_factor,
+            'decay_period_seconds': self.decay_period,
+        }
+
+
+class GuildSettingsCache:
+    """Process-wide copy of the `guild_settings` table, keyed by guild id.
+
+    Every command checks its guild's settings, so they are loaded once at startup and looked up
+    in memory; `/configure` writes through to the table and updates the cache. The guild from
+    GUILD_ID, THREAD_CHANNEL_ID and ADMIN_BOT_CHANNEL_ID is served even without a row, so a
+    single-guild deployment keeps working without configuring anything.
+    """
+
+    def __init__(self, default: GuildSettings | None):
+        self.default = default
+        self._guilds: dict[int, GuildSettings] = {}
+
+    def __len__(self):
+        return len(self.all())
+
+    def load(self, rows):
+        self._guilds = {settings.guild_id: settings for settings in map(GuildSettings.from_row, rows)}
+        print(f"🏰 Loaded settings for {len(self)} guild(s)")
+
+    def put(self, settings: GuildSettings):
+        self._guilds[settings.guild_id] = settings
+
+    def get(self, guild_id) -> GuildSettings | None:
+        settings = self._guilds.get(guild_id)
+        if settings is None and self.default is not None and guild_id == self.default.guild_id:
+            return self.default
+        return settings
+
+    def all(self) -> list[GuildSettings]:
+        guilds = dict(self._guilds)
+        if self.default is not None:
+            guilds.setdefault(self.default.guild_id, self.default)
+        return list(guilds.values())
+
+    def forum_ids(self) -> set[int]:
+        return {settings.thread_channel_id for settings in self.all()}
+
+    def decay(self, guild_id) -> tuple[float, float]:
+        """(decay factor, decay period in seconds) of the guild, the defaults if it has no settings."""
+        settings = self.get(guild_id)
+        if settings is None:
+            return DECAY_FACTOR, DECAY_PERIOD
+        return settings.decay_factor, settings.decay_period
+
+
+guild_settings = GuildSettingsCache(
+    GuildSettings(GUILD_ID, THREAD_CHANNEL_ID, ADMIN_BOT_CHANNEL_ID)
+    if GUILD_ID and THREAD_CHANNEL_ID and ADMIN_BOT_CHANNEL_ID else None
+)
@@ -0,0 +1,113 @@
+import ipaddress
+import socket
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+
+from metrics import metrics
+
+
+def parse_ip_query(query):
+    """Turns an IP, a CIDR range or a dotted IPv4 prefix into (version, first, last) integers.
+
+    `203.0.113.7`, `203.0.113.0/24` and `203.0.113.` (or `203.0.113`) are all accepted; the
+    last two match the whole /24. Raises ValueError for anything else.
+    """
+    query = query.strip()
+    if "/" not in query and ":" not in query and query.count(".") < 3:
+        octets = [octet for octet in query.split(".") if octet]
+        if not 1 <= len(octets) <= 3:
+            raise ValueError(f"not an IP address or range: {query!r}")
+        query = ".".join(octets + ["0"] * (4 - len(octets))) + f"/{8 * len(octets)}"
+
+    network = ipaddress.ip_network(query, strict=False)
+    return network.version, int(network.network_address), int(network.broadcast_address)
+
+
+def address_key(text):
+    """(version, integer) for an IPv4/IPv6 address string, or None if it is not one.
+
+    inet_pton parses in C, several times faster than ipaddress for a full history load.
+    """
+    text = (text or "").strip()
+    try:
+        if ":" in text:
+            return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, text), "big")
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, text), "big")
+    except OSError:
+        return None
+
+
+class IPIndex:
+    """Which accounts were punished from which IP, for ban-evasion lookups in /avoid.
+
+    Addresses are kept as sorted integers per IP version, so an exact match or any CIDR range
+    is two binary searches over a contiguous slice, however long the punishment history. It
+    also remembers every account's punished reasons, so /avoid can offer an account's real
+    history without a round-trip. Accounts are kept per guild and a lookup only ever returns
+    the asking guild's.
+    """
+
+    def __init__(self):
+        self._addresses: dict[int, list[int]] = {4: [], 6: []}
+        self._accounts: dict[tuple[int, int], dict[tuple[int, str], set[str]]] = {}
+        self._reasons: dict[tuple[int, str], set[str]] = defaultdict(set)
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._accounts)
+
+    def load(self, rows):
+        """Rebuilds the index from `{'guild_id', 'user_id', 'ip', 'reason'}` punishment rows."""
+        self.loaded = False
+        self._addresses = {4: [], 6: []}
+        self._accounts = {}
+        self._reasons = defaultdict(set)
+        for row in rows:
+            self._add(row)
+        for addresses in self._addresses.values():
+            addresses.sort()
+        self.loaded = True
+        print(f"🌐 Indexed {len(self._accounts)} IP addresses across {len(self._reasons)} accounts")
+
+    def add_rows(self, rows):
+        """Adds freshly written punishment rows."""
+        for row in rows:
+            self._add(row)
+
+    def _add(self, row):
+        account = (row['guild_id'], row['user_id'])
+        if row.get('reason'):
+            self._reasons[account].add(row['reason'])
+        key = address_key(row.get('ip'))
+        if key is None:
+            return
+
+        accounts = self._accounts.get(key)
+        if accounts is None:
+            accounts = self._accounts[key] = {}
+            version, address = key
+            if self.loaded:
+                insort(self._addresses[version], address)
+            else:
+                self._addresses[version].append(address)  # sorted once at the end of load()
+        reasons = accounts.setdefault(account, set())
+        if row.get('reason'):
+            reasons.add(row['reason'])
+
+    def reasons_for(self, guild_id, user_id) -> set[str]:
+        return set(self._reasons.get((guild_id, user_id), ()))
+
+    def lookup(self, guild_id, query) -> dict[str, set[str]]:
+        """Every account of the guild punished from an address matching `query`, with their reasons, as {user_id: reasons}."""
+        with metrics.span("ipindex.lookup"):
+            version, first, last = parse_ip_query(query)
+            addresses = self._addresses[version]
+            accounts = defaultdict(set)
+            for address in addresses[bisect_left(addresses, first):bisect_right(addresses, last)]:
+                for (account_guild_id, user_id), reasons in self._accounts[(version, address)].items():
+                    if account_guild_id == guild_id:
+                        accounts[user_id] |= reasons
+            return dict(accounts)
+
+
+ip_index = IPIndex()
@@ -0,0 +1,53 @@
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+
+from metrics import metrics
+
+
+class UserLocks:
+    """One asyncio.Lock per user, so bans and re-bans of the same user run one at a time.
+
+    Two mods banning the same user, or one mod double-clicking a menu, would otherwise both read
+    the same stage and both write it. Holding the user's lock from the read to the write makes
+    the second run see the first one's rows. A lock only exists while someone holds or waits for
+    it, so the table stays as small as the number of bans in flight.
+    """
+
+    def __init__(self):
+        self._locks: dict[object, tuple[asyncio.Lock, int]] = {}
+
+    def __len__(self):
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def hold(self, user):
+        """Holds the lock of `user`, a (guild_id, username) pair, for the duration of the block."""
+        lock, holders = self._locks.get(user, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        elif lock.locked():
+            metrics.inc("user_lock_waits_total")
+        self._locks[user] = (lock, holders + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, holders = self._locks[user]
+            if holders == 1:
+                del self._locks[user]
+            else:
+                self._locks[user] = (lock, holders - 1)
+
+    @asynccontextmanager
+    async def hold_many(self, users):
+        """Holds the locks of all `users` for the duration of the block.
+
+        Taken one by one in sorted order, so two callers holding overlapping sets never deadlock.
+        """
+        async with AsyncExitStack() as stack:
+            for user in sorted(set(users)):
+                await stack.enter_async_context(self.hold(user))
+            yield
+
+
+user_locks = UserLocks()
@@ -0,0 +1,45 @@
+import time
+from collections import OrderedDict
+
+from metrics import metrics
+
+
+class LiveMenus:
+    """The views of recently opened select menus, keyed by message id.
+
+    The menus themselves survive restarts, because their state lives in the component
+    custom_id. This registry only lets the background preview of an open menu learn that the
+    menu was submitted. It holds at most `max_size` views for at most `ttl` seconds, so memory
+    stays flat however long the bot runs; a menu that falls out only loses its preview.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._views: OrderedDict[int, tuple[float, object]] = OrderedDict()
+
+    def __len__(self):
+        return len(self._views)
+
+    def add(self, message_id, view):
+        self._evict_expired()
+        self._views[message_id] = (time.monotonic(), view)
+        self._views.move_to_end(message_id)
+        while len(self._views) > self.max_size:
+            self._views.popitem(last=False)
+            metrics.inc("live_menus_evicted_total")
+
+    def pop(self, message_id):
+        """Removes and returns the menu's view, or None if it expired, was evicted or predates a restart."""
+        entry = self._views.pop(message_id, None)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        while self._views:
+            opened, _ = next(iter(self._views.values()))
+            if now - opened <= self.ttl:
+                break
+            self._views.popitem(last=False)
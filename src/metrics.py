@@ -0,0 +1,138 @@
+import json
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from aiohttp import web
+
+from config import METRICS_JSONL
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.record_span(self.name, time.perf_counter() - self.started, exc_type is None)
+        return False
+
+
+class Metrics:
+    """In-process counters and latency histograms.
+
+    Recording is a couple of dict operations, cheap enough to leave on in production. The
+    numbers are served in Prometheus text format by `serve()` and every finished span can
+    also be appended to a JSON-lines file.
+    """
+
+    def __init__(self, prefix="hammer", jsonl_path=None):
+        self.prefix = prefix
+        self._counters: dict[tuple[str, tuple], float] = {}
+        self._histograms: dict[tuple[str, tuple], _Histogram] = {}
+        self._jsonl = open(jsonl_path, "a", buffering=1, encoding="utf-8") if jsonl_path else None
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = _Histogram()
+        histogram.observe(value)
+
+    def span(self, name) -> _Span:
+        """Times a block: `with metrics.span("process_ban.write"): ...`"""
+        return _Span(self, name)
+
+    def timed(self, name):
+        """Decorator form of span() for coroutine functions."""
+        def decorator(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record_span(self, name, seconds, ok=True):
+        self.observe("span_seconds", seconds, span=name)
+        if not ok:
+            self.inc("span_errors_total", span=name)
+        if self._jsonl is not None:
+            self._jsonl.write(json.dumps({"ts": time.time(), "span": name, "seconds": round(seconds, 6), "ok": ok}) + "\n")
+
+    def render(self) -> str:
+        """Prometheus text exposition of every counter and histogram."""
+        lines = []
+        for kind, families in (("counter", self._families(self._counters)), ("histogram", self._families(self._histograms))):
+            for name, series in sorted(families.items()):
+                full_name = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {full_name} {kind}")
+                for labels, value in series:
+                    if kind == "counter":
+                        lines.append(f"{full_name}{_labels(labels)} {value}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip((*BUCKETS, "+Inf"), value.counts):
+                        cumulative += count
+                        lines.append(f"{full_name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{full_name}_sum{_labels(labels)} {value.sum}")
+                    lines.append(f"{full_name}_count{_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _families(store):
+        families = {}
+        for (name, labels), value in list(store.items()):
+            families.setdefault(name, []).append((labels, value))
+        return families
+
+    async def serve(self, host, port) -> web.AppRunner:
+        async def handle(_request):
+            return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        print(f"📈 Metrics available at http://{host}:{port}/metrics")
+        return runner
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+metrics = Metrics(jsonl_path=METRICS_JSONL)
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from metrics import metrics
+
+
+class Outbox:
+    """Local write-ahead log for ban writes.
+
+    Every write is committed to a SQLite file in WAL mode before the moderator gets an answer,
+    then replayed to the remote database in order by a background task. Entries carry an
+    idempotency key, so replaying one that already landed is a no-op, and reads can merge the
+    still-pending rows so stages and decayed totals stay correct while the backlog drains.
+    Keys of replayed entries are remembered for `applied_ttl` seconds, so a duplicate submission
+    is recognised locally, without a round-trip, long after its write went out.
+
+    Transient errors are retried with backoff. An entry the database rejects for good (see
+    `is_transient`) would block every later one, so it is moved to the dead_letters table and
+    passed to `on_dead_letter`, which reports it, and the replay carries on. Dead letters go back
+    to the end of the outbox on the next start, so restarting after the fix replays them.
+    """
+
+    def __init__(self, path, sender, *, is_transient=lambda error: True, retry_delay=1.0, max_retry_delay=60.0,
+                 applied_ttl=7 * 24 * 3600):
+        self.path = path
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.applied_ttl = applied_ttl
+        self.on_dead_letter = None  # async (entry, error) callback, set by the bot
+        self._sender = sender
+        self._is_transient = is_transient
+        # sqlite3 connections belong to one thread, so every statement runs on this one.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+        self._executor.submit(self._open).result()
+        requeued = self._executor.submit(self._requeue_dead_letters).result()
+        if requeued:
+            print(f"📮 Requeued {requeued} dead-lettered ban write(s) for another replay")
+        self.pending: deque[dict] = deque(self._executor.submit(self._load).result())
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self):
+        return len(self.pending)
+
+    # SQLite side, executor thread only
+    def _open(self):
+        self._conn = sqlite3.connect(self.path, isolation_level=None)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute("pragma synchronous=full")
+        self._conn.execute(
+            "create table if not exists outbox ("
+            " seq integer primary key autoincrement,"
+            " key text not null unique,"
+            " punishments text not null,"
+            " infractions text not null,"
+            " created_at real not null)"
+        )
+        self._conn.execute("create table if not exists applied (key text primary key, applied_at real not null)")
+        self._conn.execute(
+            "create table if not exists dead_letters ("
+            " key text primary key,"
+            " punishments text not null,"
+            " infractions text not null,"
+            " created_at real not null,"
+            " error text not null,"
+            " failed_at real not null)"
+        )
+        self._conn.execute("delete from applied where applied_at < ?", (time.time() - self.applied_ttl,))
+
+    def _load(self):
+        rows = self._conn.execute("select key, punishments, infractions, created_at from outbox order by seq")
+        return [
+            {"key": key, "punishments": json.loads(punishments), "infractions": json.loads(infractions), "created_at": created_at}
+            for key, punishments, infractions, created_at in rows
+        ]
+
+    def _insert(self, entry) -> bool:
+        if self._applied(entry["key"]):
+            return False
+        cursor = self._conn.execute(
+            "insert or ignore into outbox (key, punishments, infractions, created_at) values (?, ?, ?, ?)",
+            (entry["key"], json.dumps(entry["punishments"]), json.dumps(entry["infractions"]), entry["created_at"])
+        )
+        return cursor.rowcount == 1
+
+    def _applied(self, key) -> bool:
+        return self._conn.execute("select 1 from applied where key = ?", (key,)).fetchone() is not None
+
+    def _mark_applied(self, key):
+        self._conn.execute("begin")
+        self._conn.execute("delete from outbox where key = ?", (key,))
+        self._conn.execute("insert or replace into applied (key, applied_at) values (?, ?)", (key, time.time()))
+        self._conn.execute("commit")
+
+    def _move_to_dead_letters(self, key, error):
+        self._conn.execute("begin")
+        self._conn.execute(
+            "insert or replace into dead_letters (key, punishments, infractions, created_at, error, failed_at)"
+            " select key, punishments, infractions, created_at, ?, ? from outbox where key = ?",
+            (error, time.time(), key)
+        )
+        self._conn.execute("delete from outbox where key = ?", (key,))
+        self._conn.execute("commit")
+
+    def _requeue_dead_letters(self) -> int:
+        self._conn.execute("begin")
+        cursor = self._conn.execute(
+            "insert or ignore into outbox (key, punishments, infractions, created_at)"
+            " select key, punishments, infractions, created_at from dead_letters order by created_at"
+        )
+        self._conn.execute("delete from dead_letters")
+        self._conn.execute("commit")
+        return cursor.rowcount
+
+    # event loop side
+    def start(self):
+        """Starts replaying; entries left over from a previous run go first."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if self.pending:
+            self._wakeup.set()
+
+    async def append(self, key, punishments, infractions) -> dict | None:
+        """Durably records a write and schedules it for replay.
+
+        Appending a key that is pending or was already replayed is a no-op and returns None.
+        """
+        entry = {"key": key, "punishments": list(punishments), "infractions": list(infractions), "created_at": time.time()}
+        loop = asyncio.get_running_loop()
+        added = await loop.run_in_executor(self._executor, self._insert, entry)
+        if added:
+            self.pending.append(entry)
+            self._drained.clear()
+            metrics.inc("outbox_appended_total")
+        else:
+            metrics.inc("outbox_duplicates_total")
+        self.start()
+        return entry if added else None
+
+    async def contains(self, key) -> bool:
+        """Whether a write with this key is pending or was replayed within `applied_ttl`."""
+        if any(entry["key"] == key for entry in self.pending):
+            return True
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._applied, key)
+
+    async def drain(self):
+        """Waits until every pending entry has been replayed."""
+        if self.pending:
+            await self._drained.wait()
+
+    async def _run(self):
+        delay = self.retry_delay
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.pending:
+                self._drained.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            entry = self.pending[0]
+            try:
+                await self._sender(entry["key"], entry["punishments"], entry["infractions"], entry["created_at"])
+            except Exception as e:
+                if not self._is_transient(e):
+                    self.pending.popleft()
+                    await self._dead_letter(entry, e)
+                    delay = self.retry_delay
+                    continue
+                metrics.inc("outbox_replay_errors_total")
+                print(f"⏳ Outbox replay of {entry['key']} failed ({e}), retrying in {delay:.0f}s [{len(self.pending)} pending]")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+
+            delay = self.retry_delay
+            self.pending.popleft()
+            await loop.run_in_executor(self._executor, self._mark_applied, entry["key"])
+            metrics.inc("outbox_replayed_total")
+
+    async def _dead_letter(self, entry, error):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._move_to_dead_letters, entry["key"], str(error))
+        metrics.inc("outbox_dead_letters_total")
+        print(f"❌ Outbox write {entry['key']} was rejected for good ({error}), moved to dead letters [{len(self.pending)} pending]")
+        if self.on_dead_letter is not None:
+            try:
+                await self.on_dead_letter(entry, error)
+            except Exception as e:
+                print(f"❌ Could not report dead-lettered write {entry['key']}: {e}")
+
+    # pending rows for reads
+    def pending_punishments(self, guild_id, user_ids):
+        user_ids = set(user_ids)
+        return [
+            row for entry in self.pending for row in entry["punishments"]
+            if row.get("guild_id") == guild_id and row["user_id"] in user_ids
+        ]
+
+    def pending_infractions(self, guild_id=None, user_ids=None):
+        """Pending infraction rows, timestamped with the moment they were recorded locally.
+
+        Filtered to one guild and some of its users when given; every pending row otherwise.
+        """
+        return [
+            {**row, "timestamp": datetime.fromtimestamp(entry["created_at"], timezone.utc)}
+            for entry in self.pending
+            for row in entry["infractions"]
+            if (guild_id is None or row.get("guild_id") == guild_id) and (user_ids is None or row["user_id"] in user_ids)
+        ]
@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+from metrics import metrics
+
+
+class Prefetcher:
+    """Runs a user's ban lookups in the background while their select menu is open.
+
+    Results are keyed by (kind, user) and expire after `ttl` seconds, where `user` is the
+    (guild_id, username) pair. Every write for a user invalidates their entries, so a callback
+    never acts on data read before that user's last ban.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: dict[tuple[str, str], tuple[float, asyncio.Task]] = {}
+
+    def start(self, kind, user, loader) -> asyncio.Task:
+        """Starts `loader()` for the user, replacing any earlier prefetch of the same kind."""
+        self._evict_expired()
+        task = asyncio.create_task(loader())
+        task.add_done_callback(_log_failure)
+        self._entries[(kind, user)] = (time.monotonic(), task)
+        return task
+
+    async def result(self, kind, user):
+        """Returns the prefetched result, or None if there is no fresh, successful one."""
+        entry = self._entries.get((kind, user))
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            metrics.inc("cache_lookups_total", cache=f"prefetch_{kind}", result="miss")
+            return None
+        try:
+            result = await entry[1]
+        except Exception:
+            metrics.inc("cache_lookups_total", cache=f"prefetch_{kind}", result="error")
+            return None
+        metrics.inc("cache_lookups_total", cache=f"prefetch_{kind}", result="hit")
+        return result
+
+    def invalidate(self, user):
+        for key in [key for key in self._entries if key[1] == user]:
+            del self._entries[key]
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for key in [key for key, (started, _) in self._entries.items() if now - started > self.ttl]:
+            del self._entries[key]
+
+
+def _log_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"⚠️ Prefetch failed: {task.exception()}")
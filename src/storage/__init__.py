@@ -0,0 +1,16 @@
+from storage.base import StorageBackend
+
+BACKENDS = ("supabase", "sqlite")
+
+
+def create_backend(name, **options) -> StorageBackend:
+    """Builds the backend selected by STORAGE_BACKEND. Imports are deferred so a SQLite-only
+    deployment does not need the Supabase client configured."""
+    if name == "supabase":
+        from storage.supabase_backend import SupabaseBackend
+        return SupabaseBackend(options["url"], options["key"], max_workers=options.get("max_workers", 8))
+    if name == "sqlite":
+        from storage.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(options["path"], decay_factor=options["decay_factor"], decay_period=options["decay_period"],
+                             home_guild_id=options.get("home_guild_id", 0))
+    raise ValueError(f"Unknown STORAGE_BACKEND {name!r}, expected one of: {', '.join(BACKENDS)}")
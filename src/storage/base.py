@@ -0,0 +1,117 @@
+import asyncio
+from abc import ABC, abstractmethod
+
+from metrics import metrics
+
+
+class StorageBackend(ABC):
+    """Row storage behind db.py.
+
+    Backends only move rows in and out; stage arithmetic, decay and outbox merging stay in
+    db.py so every backend behaves the same. Rows come back shaped like PostgREST returns
+    them, timestamps included as ISO-8601 strings. Every per-user read is scoped to one guild.
+    """
+
+    name = "base"
+
+    def __init__(self, executor):
+        self._executor = executor
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    async def warm(self):
+        """Prepares clients or connections ahead of the first query."""
+
+    def is_transient(self, error) -> bool:
+        """Whether a failed write may succeed if retried; the outbox dead-letters it otherwise."""
+        return isinstance(error, (OSError, asyncio.TimeoutError))
+
+    async def _run(self, name, func, *args):
+        """Runs one blocking storage call on the backend's executor, counted and timed as `db.{name}`."""
+        metrics.inc("db_queries_total", query=name)
+        with metrics.span(f"db.{name}"):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+
+    # guilds
+    @abstractmethod
+    async def get_guild_settings(self) -> list[dict]:
+        """Every guild_settings row."""
+
+    @abstractmethod
+    async def save_guild_settings(self, row) -> None:
+        """Inserts or replaces one guild's settings row."""
+
+    # catalog
+    @abstractmethod
+    async def get_catalog(self) -> list[dict]:
+        """Every catalog row, ordered by stage."""
+
+    @abstractmethod
+    async def get_catalog_punishment(self, reason, stage) -> dict | None:
+        ...
+
+    # writes
+    @abstractmethod
+    async def record_ban(self, key, punishments, infractions, recorded_at) -> list[dict]:
+        """Atomically writes one action's rows and advances user_scores.
+
+        Infraction timestamps, punishment created_at and the score checkpoint are `recorded_at`,
+        when the action was recorded locally, however much later the write arrives.
+
+        Rows carry their guild_id; scores decay with that guild's settings. A key that was already applied writes nothing and returns the rows it wrote the first time.
+        """
+
+    # punishments
+    @abstractmethod
+    async def get_punishment_stages(self, guild_id, user_ids, reasons) -> list[dict]:
+        """`{'user_id', 'reason', 'stage'}` with the highest stage of each user and reason that has one."""
+
+    @abstractmethod
+    async def get_latest_punishments(self, guild_id, user_id, reasons) -> dict[str, dict]:
+        """The newest punishment row per reason, as {reason: row}."""
+
+    @abstractmethod
+    async def get_previous_reasons(self, guild_id, user_id) -> list[str]:
+        ...
+
+    @abstractmethod
+    async def get_punishment_index(self, page_size=1000) -> list[dict]:
+        """`{'guild_id', 'user_id', 'ip', 'reason'}` for every punishment in every guild, to build the in-memory indexes from."""
+
+    @abstractmethod
+    async def get_punishment_page(self, guild_id, user_id, before, limit) -> list[dict]:
+        """Up to `limit` of the user's punishments, newest first, strictly older than the
+        `(created_at, id)` keyset cursor `before` (None for the first page)."""
+
+    # infractions
+    @abstractmethod
+    async def get_infractions(self, guild_id, user_id) -> list[dict]:
+        """`{'points', 'timestamp'}` for each of the user's infractions."""
+
+    @abstractmethod
+    async def get_all_infractions(self, guild_id, page_size=1000) -> list[dict]:
+        """`{'user_id', 'points', 'timestamp'}` for every infraction in the guild."""
+
+    @abstractmethod
+    async def get_infraction_page(self, guild_id, user_id, before, limit) -> list[dict]:
+        """Like get_punishment_page, keyed on `(timestamp, id)`."""
+
+    @abstractmethod
+    async def compact_infractions(self, epsilon, max_users) -> dict:
+        """Folds infractions whose decayed contribution is below `epsilon` into one summary row per user.
+
+        For up to `max_users` users that have such infractions, those rows and any earlier summary
+        are moved to infractions_archive and replaced by a single `source='compacted'` infraction
+        worth their combined decayed points, timestamped now. Runs in one transaction and returns
+        `{'users', 'archived'}` counts. Punishments and user_scores are left alone.
+        """
+
+    @abstractmethod
+    async def get_scored_users(self, page_size=1000) -> list[dict]:
+        """`{'guild_id', 'user_id'}` of every user_scores row, i.e. every user with an infraction, in every guild."""
+
+    @abstractmethod
+    async def get_user_scores(self, guild_id, user_ids) -> list[dict]:
+        """`{'user_id', 'score', 'checkpoint'}` rollup rows of the users that have one."""
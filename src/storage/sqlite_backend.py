@@ -0,0 +1,451 @@
+import json
+import math
+import sqlite3
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from storage.base import StorageBackend
+
+SCHEMA = """
+create table if not exists guild_settings (
+    guild_id             integer primary key,
+    thread_channel_id    integer not null,
+    admin_channel_id     integer not null,
+    allowed_channel_ids  text not null default '[]',
+    decay_factor         real not null,
+    decay_period_seconds real not null
+);
+
+create table if not exists catalog (
+    id       integer primary key autoincrement,
+    reason   text not null,
+    stage    integer not null,
+    amount   real not null,
+    points   real not null,
+    unit     text not null default 'days',
+    unique (reason, stage)
+);
+
+create table if not exists punishments (
+    id                  integer primary key autoincrement,
+    guild_id            integer not null,
+    user_id             text not null,
+    ip                  text,
+    reason              text not null,
+    base_days           real,
+    points              real,
+    multiplier          real,
+    final_duration      integer,
+    stage               integer,
+    total_points_at_ban real,
+    created_at          text not null,
+    write_key           text
+);
+create index if not exists punishments_guild_user_reason_stage_idx on punishments (guild_id, user_id, reason, stage);
+create index if not exists punishments_write_key_idx on punishments (write_key);
+-- SQLite appends the rowid (id) to every index, so this also serves the (created_at, id) keyset of /history.
+create index if not exists punishments_guild_user_created_idx on punishments (guild_id, user_id, created_at);
+
+create table if not exists infractions (
+    id        integer primary key autoincrement,
+    guild_id  integer not null,
+    user_id   text not null,
+    points    real not null,
+    context   text,
+    source    text,
+    timestamp text not null,
+    write_key text
+);
+create index if not exists infractions_guild_user_timestamp_idx on infractions (guild_id, user_id, timestamp);
+-- Compaction reads the smallest live points and then only the rows old enough to fall below epsilon.
+create index if not exists infractions_timestamp_idx on infractions (timestamp);
+create index if not exists infractions_live_points_idx on infractions (points) where source is not 'compacted';
+
+-- Infractions folded into a summary by compaction, kept for audits; never read by the bot.
+create table if not exists infractions_archive (
+    id          integer primary key,
+    guild_id    integer not null,
+    user_id     text not null,
+    points      real not null,
+    context     text,
+    source      text,
+    timestamp   text not null,
+    write_key   text,
+    archived_at text not null
+);
+
+create table if not exists user_scores (
+    guild_id   integer not null,
+    user_id    text not null,
+    score      real not null default 0,
+    checkpoint text not null,
+    primary key (guild_id, user_id)
+);
+
+create table if not exists ban_writes (
+    key        text primary key,
+    created_at text not null
+);
+"""
+
+PUNISHMENT_COLUMNS = ('guild_id', 'user_id', 'ip', 'reason', 'base_days', 'points', 'multiplier',
+                      'final_duration', 'stage', 'total_points_at_ban')
+INFRACTION_COLUMNS = ('guild_id', 'user_id', 'points', 'context', 'source')
+ARCHIVE_COLUMNS = "id, guild_id, user_id, points, context, source, timestamp, write_key"
+GUILD_SETTINGS_COLUMNS = ('guild_id', 'thread_channel_id', 'admin_channel_id', 'allowed_channel_ids',
+                          'decay_factor', 'decay_period_seconds')
+
+# Files created before multi-guild support lack guild_id; their rows belong to the home guild.
+MIGRATE_TO_GUILDS = """
+alter table punishments add column guild_id integer not null default 0;
+alter table infractions add column guild_id integer not null default 0;
+update punishments set guild_id = :guild_id;
+update infractions set guild_id = :guild_id;
+drop index if exists punishments_user_reason_stage_idx;
+drop index if exists punishments_user_created_idx;
+drop index if exists infractions_user_timestamp_idx;
+alter table user_scores rename to user_scores_single_guild;
+create table user_scores (
+    guild_id   integer not null,
+    user_id    text not null,
+    score      real not null default 0,
+    checkpoint text not null,
+    primary key (guild_id, user_id)
+);
+insert into user_scores (guild_id, user_id, score, checkpoint)
+select :guild_id, user_id, score, checkpoint from user_scores_single_guild;
+drop table user_scores_single_guild;
+"""
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteBackend(StorageBackend):
+    """Everything in one local SQLite file, for small deployments and tests.
+
+    Same tables as the Supabase project, indexed on punishments (guild_id, user_id, reason, stage)
+    and infractions (guild_id, user_id, timestamp) so the per-user lookups stay sub-millisecond.
+    Timestamps are stored as ISO-8601 UTC strings, which sort correctly as text.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path, *, decay_factor, decay_period, home_guild_id=0):
+        # sqlite3 connections belong to one thread, so every statement runs on this one.
+        super().__init__(ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite"))
+        self.path = path
+        self.decay_factor = decay_factor
+        self.decay_period = decay_period
+        self.home_guild_id = home_guild_id
+        self._executor.submit(self._open).result()
+
+    def _open(self):
+        self._conn = sqlite3.connect(self.path, isolation_level=None)
+        self._conn.row_factory = _dict_row
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.execute("pragma synchronous=normal")
+        columns = {row['name'] for row in self._query("pragma table_info(punishments)")}
+        if columns and 'guild_id' not in columns:
+            self._conn.execute("begin")
+            for statement in MIGRATE_TO_GUILDS.split(";"):
+                if statement.strip():
+                    self._conn.execute(statement, {'guild_id': self.home_guild_id})
+            self._conn.execute("commit")
+            print(f"🏰 Moved the existing SQLite history to guild {self.home_guild_id}")
+        self._conn.executescript(SCHEMA)
+
+    def is_transient(self, error):
+        # A busy or locked file clears up; a missing table or a constraint violation does not.
+        if isinstance(error, sqlite3.OperationalError):
+            return 'locked' in str(error) or 'busy' in str(error)
+        return super().is_transient(error)
+
+    def close(self):
+        self._executor.submit(self._conn.close).result()
+        super().close()
+
+    def _query(self, sql, params=()):
+        return self._conn.execute(sql, params).fetchall()
+
+    async def _select(self, name, sql, params=()):
+        return await self._run(name, self._query, sql, tuple(params))
+
+    @staticmethod
+    def _placeholders(values):
+        return ", ".join("?" * len(values))
+
+    # guilds
+    async def get_guild_settings(self):
+        rows = await self._select('get_guild_settings', "select * from guild_settings")
+        return [{**row, 'allowed_channel_ids': json.loads(row['allowed_channel_ids'])} for row in rows]
+
+    def _save_guild_settings(self, row):
+        row = {**row, 'allowed_channel_ids': json.dumps(list(row['allowed_channel_ids']))}
+        self._conn.execute(
+            f"insert or replace into guild_settings ({', '.join(GUILD_SETTINGS_COLUMNS)})"
+            f" values ({self._placeholders(GUILD_SETTINGS_COLUMNS)})",
+            tuple(row[column] for column in GUILD_SETTINGS_COLUMNS)
+        )
+
+    async def save_guild_settings(self, row):
+        await self._run('save_guild_settings', self._save_guild_settings, row)
+
+    def _decay(self, guild_id):
+        rows = self._query("select decay_factor, decay_period_seconds from guild_settings where guild_id = ?", (guild_id,))
+        if not rows:
+            return self.decay_factor, self.decay_period
+        return rows[0]['decay_factor'], rows[0]['decay_period_seconds']
+
+    # catalog
+    async def get_catalog(self):
+        return await self._select('get_all_punishment_options', "select * from catalog order by stage")
+
+    async def get_catalog_punishment(self, reason, stage):
+        rows = await self._select('get_catalog_punishment', "select * from catalog where reason = ? and stage = ? limit 1", (reason, stage))
+        return rows[0] if rows else None
+
+    # writes
+    def _insert(self, table, columns, rows, extra):
+        names = (*columns, *extra)
+        sql = f"insert into {table} ({', '.join(names)}) values ({self._placeholders(names)}) returning *"
+        return [
+            self._conn.execute(sql, (*(row.get(c) for c in columns), *extra.values())).fetchone()
+            for row in rows
+        ]
+
+    def _record_ban(self, key, punishments, infractions, recorded_at):
+        now = recorded_at
+        self._conn.execute("begin immediate")
+        try:
+            if self._conn.execute("insert or ignore into ban_writes (key, created_at) values (?, ?)", (key, now.isoformat())).rowcount == 0:
+                rows = self._query("select * from punishments where write_key = ? order by id", (key,))
+                self._conn.execute("commit")
+                return rows
+
+            stamp = {'write_key': key}
+            self._insert('infractions', INFRACTION_COLUMNS, infractions, {'timestamp': now.isoformat(), **stamp})
+
+            added = defaultdict(float)
+            for row in infractions:
+                added[(row['guild_id'], row['user_id'])] += row['points']
+            for (guild_id, user_id), points in added.items():
+                existing = self._query("select score, checkpoint from user_scores where guild_id = ? and user_id = ?", (guild_id, user_id))
+                score, checkpoint = points, now
+                if existing:
+                    # Whichever side is older decays up to the newer one, which becomes the checkpoint.
+                    decay_factor, decay_period = self._decay(guild_id)
+                    previous = datetime.fromisoformat(existing[0]['checkpoint'])
+                    checkpoint = max(previous, now)
+                    score = (existing[0]['score'] * decay_factor ** ((checkpoint - previous).total_seconds() / decay_period)
+                             + points * decay_factor ** ((checkpoint - now).total_seconds() / decay_period))
+                self._conn.execute(
+                    "insert or replace into user_scores (guild_id, user_id, score, checkpoint) values (?, ?, ?, ?)",
+                    (guild_id, user_id, score, checkpoint.isoformat())
+                )
+
+            rows = self._insert('punishments', PUNISHMENT_COLUMNS, punishments, {'created_at': now.isoformat(), **stamp})
+            self._conn.execute("commit")
+            return rows
+        except BaseException:
+            self._conn.execute("rollback")
+            raise
+
+    async def record_ban(self, key, punishments, infractions, recorded_at):
+        return await self._run('record_ban', self._record_ban, key, list(punishments), list(infractions), recorded_at)
+
+    def _import_rows(self, table, rows):
+        # An exported rollup row stands in for the one rebuilt from that user's infractions.
+        verb = "insert or replace" if table == 'user_scores' else "insert"
+        self._conn.execute("begin")
+        for row in rows:
+            self._conn.execute(f"{verb} into {table} ({', '.join(row)}) values ({self._placeholders(row)})", tuple(row.values()))
+        if table == 'infractions':
+            self._rebuild_scores({(row['guild_id'], row['user_id']) for row in rows})
+        self._conn.execute("commit")
+
+    def _rebuild_scores(self, users):
+        """Reseeds the user_scores rows of `users` from their whole infraction history, as of now."""
+        now = _utcnow()
+        for guild_id, user_id in users:
+            decay_factor, decay_period = self._decay(guild_id)
+            # The same stepped decay as calculate_total_decayed_points, like the 002 migration's seed.
+            score = sum(
+                row['points'] * decay_factor ** int((now - datetime.fromisoformat(row['timestamp'])).total_seconds() // decay_period)
+                for row in self._query("select points, timestamp from infractions where guild_id = ? and user_id = ?", (guild_id, user_id))
+            )
+            self._conn.execute(
+                "insert or replace into user_scores (guild_id, user_id, score, checkpoint) values (?, ?, ?, ?)",
+                (guild_id, user_id, score, now.isoformat())
+            )
+
+    async def import_rows(self, table, rows):
+        """Bulk-loads rows as they are, e.g. a catalog or history exported from Supabase.
+
+        Imported infractions also rebuild their users' user_scores rows, so decayed totals include them.
+        """
+        await self._run('import_rows', self._import_rows, table, list(rows))
+
+    # punishments
+    async def get_punishment_stages(self, guild_id, user_ids, reasons):
+        user_ids, reasons = list(user_ids), list(reasons)
+        return await self._select(
+            'get_stages_for_users',
+            f"select user_id, reason, max(stage) as stage from punishments where guild_id = ?"
+            f" and user_id in ({self._placeholders(user_ids)}) and reason in ({self._placeholders(reasons)})"
+            f" and stage is not null group by user_id, reason",
+            (guild_id, *user_ids, *reasons)
+        )
+
+    async def get_latest_punishments(self, guild_id, user_id, reasons):
+        reasons = list(reasons)
+        rows = await self._select(
+            'get_latest_punishments',
+            f"select * from punishments where guild_id = ? and user_id = ? and reason in ({self._placeholders(reasons)})"
+            f" order by created_at desc, id desc",
+            (guild_id, user_id, *reasons)
+        )
+        latest = {}
+        for row in rows:
+            latest.setdefault(row['reason'], row)
+        return latest
+
+    async def get_previous_reasons(self, guild_id, user_id):
+        rows = await self._select(
+            'get_previous_reasons_for_user',
+            "select distinct reason from punishments where guild_id = ? and user_id = ?",
+            (guild_id, user_id)
+        )
+        return [row['reason'] for row in rows]
+
+    async def get_punishment_index(self, page_size=1000):
+        return await self._select('fetch_punishment_index', "select guild_id, user_id, ip, reason from punishments")
+
+    async def _page(self, name, table, columns, time_column, guild_id, user_id, before, limit):
+        sql = f"select {columns} from {table} where guild_id = ? and user_id = ?"
+        params = [guild_id, user_id]
+        if before is not None:
+            sql += f" and ({time_column}, id) < (?, ?)"
+            params += before
+        sql += f" order by {time_column} desc, id desc limit ?"
+        return await self._select(name, sql, (*params, limit))
+
+    async def get_punishment_page(self, guild_id, user_id, before, limit):
+        return await self._page('get_punishment_page', 'punishments', 'id, created_at, reason, stage, final_duration, ip, write_key',
+                                'created_at', guild_id, user_id, before, limit)
+
+    # infractions
+    async def get_infractions(self, guild_id, user_id):
+        return await self._select(
+            'fetch_user_infractions',
+            "select points, timestamp from infractions where guild_id = ? and user_id = ? order by timestamp",
+            (guild_id, user_id)
+        )
+
+    async def get_all_infractions(self, guild_id, page_size=1000):
+        # Local reads have no per-request cost worth paging around.
+        return await self._select(
+            'fetch_all_infractions',
+            "select id, user_id, points, timestamp from infractions where guild_id = ? order by id",
+            (guild_id,)
+        )
+
+    async def get_infraction_page(self, guild_id, user_id, before, limit):
+        return await self._page('get_infraction_page', 'infractions', 'id, timestamp, points, context, source, write_key',
+                                'timestamp', guild_id, user_id, before, limit)
+
+    def _compaction_cutoff(self, epsilon, now):
+        """The newest timestamp an infraction can have and still be worth less than epsilon, or None if none can."""
+        min_points = self._query("select min(points) as points from infractions where source is not 'compacted'")[0]['points']
+        if min_points is None:
+            return None
+        if min_points <= epsilon:
+            return now
+        decays = [(row['decay_factor'], row['decay_period_seconds'])
+                  for row in self._query("select decay_factor, decay_period_seconds from guild_settings")]
+        decays.append((self.decay_factor, self.decay_period))
+        # points * factor ** steps < epsilon needs more than log(epsilon / points) / log(factor) whole periods;
+        # the floor keeps the cutoff a step early so rounding never skips a row. No decay, no cutoff.
+        ages = [period * math.floor(math.log(epsilon / min_points) / math.log(factor))
+                for factor, period in decays if factor < 1]
+        if not ages:
+            return None
+        return now - timedelta(seconds=min(ages))
+
+    def _compact_infractions(self, epsilon, max_users):
+        now = _utcnow()
+        self._conn.execute("begin immediate")
+        try:
+            cutoff = self._compaction_cutoff(epsilon, now)
+            if cutoff is None:
+                self._conn.execute("commit")
+                return {'users': 0, 'archived': 0}
+            decay = {}
+
+            def decayed(row):
+                if row['guild_id'] not in decay:
+                    decay[row['guild_id']] = self._decay(row['guild_id'])
+                decay_factor, decay_period = decay[row['guild_id']]
+                # Same stepped decay as calculate_total_decayed_points.
+                age_seconds = (now - datetime.fromisoformat(row['timestamp'])).total_seconds()
+                return {**row, 'value': row['points'] * decay_factor ** int(age_seconds // decay_period)}
+
+            folded = defaultdict(list)
+            rows = self._query(
+                "select id, guild_id, user_id, points, timestamp from infractions"
+                " where timestamp <= ? and source is not 'compacted'",
+                (cutoff.isoformat(),)
+            )
+            for row in map(decayed, rows):
+                if row['value'] < epsilon:
+                    folded[(row['guild_id'], row['user_id'])].append(row)
+
+            users = list(folded)[:max_users]
+            archived = 0
+            for guild_id, user_id in users:
+                # The user's earlier summary is folded into the new one.
+                rows = folded[(guild_id, user_id)] + [decayed(row) for row in self._query(
+                    "select id, guild_id, user_id, points, timestamp from infractions"
+                    " where guild_id = ? and user_id = ? and source = 'compacted'",
+                    (guild_id, user_id)
+                )]
+                ids = [row['id'] for row in rows]
+                self._conn.execute(
+                    f"insert into infractions_archive ({ARCHIVE_COLUMNS}, archived_at)"
+                    f" select {ARCHIVE_COLUMNS}, ? from infractions where id in ({self._placeholders(ids)})",
+                    (now.isoformat(), *ids)
+                )
+                self._conn.execute(f"delete from infractions where id in ({self._placeholders(ids)})", ids)
+                self._insert('infractions', INFRACTION_COLUMNS, [{
+                    'guild_id': guild_id,
+                    'user_id': user_id,
+                    'points': sum(row['value'] for row in rows),
+                    'context': f"{len(rows)} decayed infraction(s) compacted",
+                    'source': 'compacted',
+                }], {'timestamp': now.isoformat()})
+                archived += len(rows)
+            self._conn.execute("commit")
+            return {'users': len(users), 'archived': archived}
+        except BaseException:
+            self._conn.execute("rollback")
+            raise
+
+    async def compact_infractions(self, epsilon, max_users):
+        return await self._run('compact_infractions', self._compact_infractions, epsilon, max_users)
+
+    async def get_scored_users(self, page_size=1000):
+        return await self._select('fetch_scored_users', "select guild_id, user_id from user_scores")
+
+    async def get_user_scores(self, guild_id, user_ids):
+        user_ids = list(user_ids)
+        return await self._select(
+            'get_decayed_points_many',
+            f"select user_id, score, checkpoint from user_scores where guild_id = ? and user_id in ({self._placeholders(user_ids)})",
+            (guild_id, *user_ids)
+        )
@@ -0,0 +1,212 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from storage.base import StorageBackend
+
+# PostgREST could not reach or query the database (PGRST000-PGRST003), or a function, table or
+# column is missing from its schema cache (PGRST202-PGRST205): worth retrying, as the database
+# comes back and a migration deployed after the bot gets applied.
+TRANSIENT_POSTGREST_CODES = {'PGRST000', 'PGRST001', 'PGRST002', 'PGRST003', 'PGRST202', 'PGRST204', 'PGRST205'}
+# Undefined column, table and function: the same missing-migration case, reported by Postgres.
+TRANSIENT_SQLSTATES = {'42703', '42P01', '42883'}
+# PostgREST's default cap on rows per response.
+MAX_ROWS = 1000
+# SQLSTATE classes for connection loss, serialization failures, exhausted resources and restarts.
+TRANSIENT_SQLSTATE_CLASSES = {'08', '40', '53', '57'}
+
+
+class SupabaseBackend(StorageBackend):
+    """The hosted Supabase database, through PostgREST and the record_ban RPC in sql/."""
+
+    name = "supabase"
+
+    def __init__(self, url=None, key=None, *, client=None, max_workers=8):
+        # supabase-py is synchronous, so every round-trip runs on a small pool of worker threads that
+        # share the one client (and its pooled HTTP connections) instead of blocking the event loop.
+        super().__init__(ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="supabase"))
+        self.url = url
+        self.key = key
+        self._client = client
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Importing supabase and building the client takes a few hundred milliseconds, so it
+        # happens on first use (or in warm(), alongside the gateway connect) instead of at import.
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from supabase import create_client
+                    self._client = create_client(self.url, self.key)
+        return self._client
+
+    async def warm(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, lambda: self.client)
+
+    def is_transient(self, error):
+        from httpx import TransportError
+        from postgrest.exceptions import APIError
+
+        if isinstance(error, TransportError):
+            return True
+        if isinstance(error, APIError):
+            code = str(error.code or '')
+            if len(code) == 3 and code.isdigit():  # an HTTP status, e.g. from the gateway in front of PostgREST
+                return code == '429' or code >= '500'
+            return (code in TRANSIENT_POSTGREST_CODES or code in TRANSIENT_SQLSTATES
+                    or code[:2] in TRANSIENT_SQLSTATE_CLASSES)
+        return super().is_transient(error)
+
+    async def _execute(self, name, query):
+        return await self._run(name, query.execute)
+
+    async def get_guild_settings(self):
+        result = await self._execute('get_guild_settings', self.client.from_('guild_settings').select('*'))
+        return result.data or []
+
+    async def save_guild_settings(self, row):
+        await self._execute('save_guild_settings', self.client.from_('guild_settings').upsert(row, on_conflict='guild_id'))
+
+    async def get_catalog(self):
+        result = await self._execute('get_all_punishment_options', self.client.from_('catalog').select('*').order('stage', desc=False))
+        return result.data or []
+
+    async def get_catalog_punishment(self, reason, stage):
+        result = await self._execute(
+            'get_catalog_punishment',
+            self.client
+            .from_('catalog')
+            .select('*')
+            .eq('reason', reason)
+            .eq('stage', stage)
+            .limit(1)
+        )
+        return result.data[0] if result.data else None
+
+    async def record_ban(self, key, punishments, infractions, recorded_at):
+        result = await self._execute('record_ban', self.client.rpc('record_ban', {
+            'p_key': key,
+            'p_punishments': list(punishments),
+            'p_infractions': list(infractions),
+            'p_recorded_at': recorded_at.isoformat(),
+        }))
+        return result.data or []
+
+    async def get_punishment_stages(self, guild_id, user_ids, reasons):
+        # The RPC returns at most one row per (user, reason); users are split so no response can
+        # reach PostgREST's row limit.
+        user_ids, reasons = list(user_ids), list(reasons)
+        chunk = max(MAX_ROWS // max(len(reasons), 1), 1)
+        responses = await asyncio.gather(*(
+            self._execute('get_stages_for_users', self.client.rpc('punishment_stages', {
+                'p_guild_id': guild_id,
+                'p_user_ids': user_ids[start:start + chunk],
+                'p_reasons': reasons,
+            }))
+            for start in range(0, len(user_ids), chunk)
+        ))
+        return [row for response in responses for row in response.data or []]
+
+    async def get_latest_punishments(self, guild_id, user_id, reasons):
+        result = await self._execute(
+            'get_latest_punishments',
+            self.client
+            .from_('punishments')
+            .select('*')
+            .eq('guild_id', guild_id)
+            .eq('user_id', user_id)
+            .in_('reason', list(reasons))
+            .order('created_at', desc=True)
+        )
+        latest = {}
+        for row in result.data or []:
+            latest.setdefault(row['reason'], row)
+        return latest
+
+    async def get_previous_reasons(self, guild_id, user_id):
+        rows = await self._execute(
+            'get_previous_reasons_for_user',
+            self.client.from_('punishments').select('reason').eq('guild_id', guild_id).eq('user_id', user_id)
+        )
+        return list({r['reason'] for r in rows.data})
+
+    async def get_punishment_index(self, page_size=1000):
+        rows = []
+        last_id = None
+        while True:
+            query = self.client.from_('punishments').select('id, guild_id, user_id, ip, reason').order('id').limit(page_size)
+            if last_id is not None:
+                query = query.gt('id', last_id)
+
+            page = (await self._execute('fetch_punishment_index', query)).data or []
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+            last_id = page[-1]['id']
+
+    async def _page(self, name, table, columns, time_column, guild_id, user_id, before, limit):
+        query = (self.client.from_(table).select(columns).eq('guild_id', guild_id).eq('user_id', user_id)
+                 .order(time_column, desc=True).order('id', desc=True).limit(limit))
+        if before is not None:
+            at, row_id = before
+            query = query.or_(f'{time_column}.lt."{at}",and({time_column}.eq."{at}",id.lt.{row_id})')
+        return (await self._execute(name, query)).data or []
+
+    async def get_punishment_page(self, guild_id, user_id, before, limit):
+        return await self._page('get_punishment_page', 'punishments', 'id, created_at, reason, stage, final_duration, ip, write_key',
+                                'created_at', guild_id, user_id, before, limit)
+
+    async def get_infraction_page(self, guild_id, user_id, before, limit):
+        return await self._page('get_infraction_page', 'infractions', 'id, timestamp, points, context, source, write_key',
+                                'timestamp', guild_id, user_id, before, limit)
+
+    async def get_infractions(self, guild_id, user_id):
+        response = await self._execute(
+            'fetch_user_infractions',
+            self.client.from_('infractions').select('points, timestamp').eq('guild_id', guild_id).eq('user_id', user_id)
+        )
+        return response.data or []
+
+    async def get_all_infractions(self, guild_id, page_size=1000):
+        rows = []
+        last_id = None
+        while True:
+            query = (self.client.from_('infractions').select('id, user_id, points, timestamp')
+                     .eq('guild_id', guild_id).order('id').limit(page_size))
+            if last_id is not None:
+                query = query.gt('id', last_id)
+
+            page = (await self._execute('fetch_all_infractions', query)).data or []
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+            last_id = page[-1]['id']
+
+    async def compact_infractions(self, epsilon, max_users):
+        result = await self._execute('compact_infractions', self.client.rpc('compact_infractions', {
+            'p_epsilon': epsilon,
+            'p_max_users': max_users,
+        }))
+        return result.data[0] if result.data else {'users': 0, 'archived': 0}
+
+    async def get_scored_users(self, page_size=1000):
+        rows = []
+        while True:
+            query = self.client.from_('user_scores').select('guild_id, user_id').order('guild_id').order('user_id').limit(page_size)
+            if rows:
+                guild_id, user_id = rows[-1]['guild_id'], rows[-1]['user_id']
+                query = query.or_(f'guild_id.gt.{guild_id},and(guild_id.eq.{guild_id},user_id.gt."{user_id}")')
+
+            page = (await self._execute('fetch_scored_users', query)).data or []
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+
+    async def get_user_scores(self, guild_id, user_ids):
+        response = await self._execute(
+            'get_decayed_points_many',
+            self.client.from_('user_scores').select('user_id, score, checkpoint').eq('guild_id', guild_id).in_('user_id', list(user_ids))
+        )
+        return response.data or []
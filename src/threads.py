@@ -0,0 +1,110 @@
+import asyncio
+
+import discord
+
+from metrics import metrics
+
+
+class ThreadIndex:
+    """Maps usernames to their punishment thread in each guild's forum channel.
+
+    Discord only lists active threads on the channel, and threads auto-archive after an hour,
+    so the index is warmed from both active and archived threads at startup and updated on every
+    thread we create. Lookups are a dict hit; archived threads are reopened instead of duplicated.
+    Entries are keyed by (forum id, username), as the same name can have a thread in every guild.
+    Callers wait for the forum to be warmed (`wait_warm`, at most `warm_timeout` seconds) before
+    posting, so a ban right after a restart reuses the user's thread instead of creating a second one.
+    """
+
+    def __init__(self, warm_timeout: float = 60.0):
+        self.warm_timeout = warm_timeout
+        self._ids: dict[tuple[int, str], int] = {}
+        self._warmed: dict[int, asyncio.Event] = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _warm_event(self, forum_id: int) -> asyncio.Event:
+        return self._warmed.setdefault(forum_id, asyncio.Event())
+
+    async def warm(self, forum: discord.ForumChannel):
+        try:
+            ids = {}
+            for thread in forum.threads:
+                ids.setdefault((forum.id, thread.name), thread.id)
+            async for thread in forum.archived_threads(limit=None):
+                ids.setdefault((forum.id, thread.name), thread.id)
+
+            self._ids = {key: thread_id for key, thread_id in self._ids.items() if key[0] != forum.id}
+            self._ids.update(ids)
+            print(f"🧵 Indexed {len(ids)} punishment threads in #{forum.name}")
+        finally:
+            self.release(forum.id)
+
+    def is_warm(self, forum_id: int) -> bool:
+        return self._warm_event(forum_id).is_set()
+
+    def release(self, forum_id: int):
+        """Lets posts to the forum go ahead; also called when warming failed, so they fall back to creating threads."""
+        self._warm_event(forum_id).set()
+
+    async def wait_warm(self, forum_id: int):
+        """Waits until the forum's threads have been indexed, or `warm_timeout` has passed."""
+        event = self._warm_event(forum_id)
+        if event.is_set():
+            return
+        metrics.inc("thread_index_waits_total")
+        try:
+            await asyncio.wait_for(event.wait(), self.warm_timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Threads of forum {forum_id} still not indexed after {self.warm_timeout:.0f}s, posting anyway")
+
+    def get_id(self, forum_id: int, username) -> int | None:
+        return self._ids.get((forum_id, username))
+
+    def add(self, forum_id: int, username, thread_id: int):
+        self._ids.setdefault((forum_id, username), thread_id)
+
+    def discard(self, thread_id: int):
+        for key, tid in list(self._ids.items()):
+            if tid == thread_id:
+                del self._ids[key]
+
+    async def resolve(self, forum: discord.ForumChannel, username) -> discord.Thread | None:
+        """Returns the user's thread, unarchived and ready to post in, or None if they have none."""
+        thread_id = self._ids.get((forum.id, username))
+        metrics.inc("cache_lookups_total", cache="threads", result="miss" if thread_id is None else "hit")
+        if thread_id is None:
+            return None
+
+        thread = forum.get_thread(thread_id)
+        if thread is None:
+            try:
+                thread = await forum.guild.fetch_channel(thread_id)
+            except discord.NotFound:  # thread was deleted
+                self._ids.pop((forum.id, username), None)
+                return None
+
+        if thread.archived:
+            await thread.edit(archived=False)
+        return thread
+
+    async def post(self, forum: discord.ForumChannel, username, content, reason) -> int:
+        """Posts to the user's thread, creating it if needed, and returns the thread id."""
+        thread = await self.resolve(forum, username)
+        if thread:
+            await thread.send(content, silent=True)
+            return thread.id
+
+        created = await forum.create_thread(
+            name=username,
+            content=content,
+            auto_archive_duration=60,
+            reason=reason,
+            allowed_mentions=discord.AllowedMentions.none()
+        )
+        self._ids[(forum.id, username)] = created.thread.id
+        return created.thread.id
+
+
+thread_index = ThreadIndex()
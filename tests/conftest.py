@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The bot runs from src/ with flat imports; the tests import its modules the same way.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+# db builds its backend and outbox at import time; keep them in memory and out of the real outbox.
+for key, value in {
+    "GUILD_ID": "1",
+    "OUTBOX_PATH": os.path.join(tempfile.mkdtemp(prefix="hammer-tests-"), "outbox.sqlite3"),
+    "STORAGE_BACKEND": "sqlite",
+    "SQLITE_PATH": ":memory:",
+}.items():
+    os.environ.setdefault(key, value)
@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from storage.sqlite_backend import SQLiteBackend
+
+DECAY_FACTOR = 0.95
+DECAY_PERIOD = 60 * 60 * 24 * 60
+GUILD_ID = 1
+
+
+@pytest.fixture
+def backend():
+    backend = SQLiteBackend(":memory:", decay_factor=DECAY_FACTOR, decay_period=DECAY_PERIOD, home_guild_id=GUILD_ID)
+    yield backend
+    backend.close()
+
+
+def infraction(user_id, points, age_days):
+    timestamp = datetime.now(timezone.utc) - timedelta(days=age_days)
+    return {"guild_id": GUILD_ID, "user_id": user_id, "points": points, "context": "test",
+            "source": "automated", "timestamp": timestamp.isoformat()}
+
+
+def count(backend, table):
+    return backend._executor.submit(backend._query, f"select count(*) as n from {table}").result()[0]["n"]
+
+
+def test_second_compaction_is_a_no_op(backend):
+    # ~10 years old: 60 decay periods, well below the epsilon.
+    rows = [infraction(user, 1.0, 3650) for user in ("a", "b", "c") for _ in range(2)]
+    asyncio.run(backend.import_rows("infractions", rows))
+
+    first = asyncio.run(backend.compact_infractions(0.1, 500))
+    assert first == {"users": 3, "archived": 6}
+    assert count(backend, "infractions") == 3
+
+    second = asyncio.run(backend.compact_infractions(0.1, 500))
+    assert second == {"users": 0, "archived": 0}
+    assert count(backend, "infractions_archive") == 6
+    assert count(backend, "infractions") == 3
+
+
+def test_summary_is_folded_in_with_new_rows(backend):
+    asyncio.run(backend.import_rows("infractions", [infraction("a", 1.0, 3650)]))
+    asyncio.run(backend.compact_infractions(0.1, 500))
+
+    asyncio.run(backend.import_rows("infractions", [infraction("a", 1.0, 3650), infraction("a", 5.0, 1)]))
+    result = asyncio.run(backend.compact_infractions(0.1, 500))
+
+    assert result == {"users": 1, "archived": 2}  # the new sub-epsilon row and the old summary
+    sources = backend._executor.submit(backend._query, "select source from infractions order by source").result()
+    assert [row["source"] for row in sources] == ["automated", "compacted"]
+
+
+def test_rows_too_recent_to_qualify_are_not_read(backend):
+    # 1 point needs 28 periods to fall below 0.25; the cutoff sits a period early.
+    asyncio.run(backend.import_rows("infractions", [infraction("a", 1.0, 60 * 26), infraction("b", 1.0, 60 * 29)]))
+    now = datetime.now(timezone.utc)
+
+    cutoff = backend._executor.submit(backend._compaction_cutoff, 0.25, now).result()
+    assert cutoff == now - timedelta(seconds=27 * DECAY_PERIOD)
+
+    result = asyncio.run(backend.compact_infractions(0.25, 500))
+    assert result == {"users": 1, "archived": 1}
+    users = backend._executor.submit(backend._query, "select user_id, source from infractions order by user_id").result()
+    assert [(row["user_id"], row["source"]) for row in users] == [("a", "automated"), ("b", "compacted")]
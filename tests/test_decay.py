@@ -0,0 +1,65 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from db import calculate_total_decayed_points
+from decay import InfractionColumns, decayed_totals
+
+NOW = datetime(2026, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def rows(seed, users=20, per_user=30):
+    rng = random.Random(seed)
+    result = []
+    for user in range(users):
+        for _ in range(per_user):
+            moment = NOW - timedelta(seconds=rng.uniform(0, 10 * 365 * 86_400))
+            result.append({"user_id": f"user-{user}", "points": rng.choice([1.0, 2.0, 3.0, 0.5]), "timestamp": moment})
+    return result
+
+
+def as_string(moment, style):
+    if style == "z":
+        return moment.isoformat().replace("+00:00", "Z")
+    if style == "short":  # Postgres trims trailing zeros from the fraction
+        return moment.replace(microsecond=moment.microsecond // 1000 * 1000).isoformat(timespec="milliseconds")
+    if style == "offset":
+        return moment.astimezone(timezone(timedelta(hours=2))).isoformat()
+    return moment.isoformat()
+
+
+def expected(rows, test_mode):
+    by_user = {}
+    for row in rows:
+        timestamp = row["timestamp"]
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        by_user.setdefault(row["user_id"], []).append({"points": row["points"], "timestamp": timestamp})
+    return {user: calculate_total_decayed_points(infractions, NOW, test_mode) for user, infractions in by_user.items()}
+
+
+@pytest.mark.parametrize("test_mode", [False, True])
+@pytest.mark.parametrize("style", ["datetime", "utc", "z", "short", "offset", "mixed"])
+def test_matches_per_user_decay(style, test_mode):
+    data = rows(seed=len(style))
+    if test_mode:  # 15 second periods: keep ages within a few hundred of them
+        data = [{**row, "timestamp": NOW - (NOW - row["timestamp"]) / 50_000} for row in data]
+    if style == "mixed":
+        styles = ["datetime", "utc", "z", "short"]
+        data = [{**row, "timestamp": row["timestamp"] if i % 4 == 0 else as_string(row["timestamp"], styles[i % 4])}
+                for i, row in enumerate(data)]
+    elif style != "datetime":
+        data = [{**row, "timestamp": as_string(row["timestamp"], style)} for row in data]
+
+    assert decayed_totals(InfractionColumns.from_rows(data), NOW, test_mode) == expected(data, test_mode)
+
+
+def test_period_boundary_is_exact():
+    # Exactly one period old decays once; a microsecond less does not.
+    period = timedelta(days=60)
+    data = [
+        {"user_id": "a", "points": 1.0, "timestamp": (NOW - period).isoformat()},
+        {"user_id": "b", "points": 1.0, "timestamp": (NOW - period + timedelta(microseconds=1)).isoformat()},
+    ]
+    assert decayed_totals(InfractionColumns.from_rows(data), NOW) == {"a": 0.95, "b": 1.0} == expected(data, False)
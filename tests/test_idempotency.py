@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime, timezone
+
+import db
+from locks import UserLocks
+from outbox import Outbox
+
+
+def test_same_user_is_serialised_and_others_are_not():
+    async def main():
+        locks = UserLocks()
+        events = []
+
+        async def ban(user, name):
+            async with locks.hold(user):
+                events.append(f"{name} start")
+                await asyncio.sleep(0.01)
+                events.append(f"{name} end")
+
+        await asyncio.gather(ban((1, "a"), "first"), ban((1, "a"), "second"), ban((1, "b"), "other"))
+        return events, len(locks)
+
+    events, held = asyncio.run(main())
+    assert events.index("first end") < events.index("second start")
+    assert events.index("other start") < events.index("first end")
+    assert held == 0  # locks are dropped once nobody holds them
+
+
+def test_overlapping_hold_many_does_not_deadlock():
+    async def main():
+        locks = UserLocks()
+
+        async def bulk(users):
+            async with locks.hold_many(users):
+                await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(asyncio.gather(bulk([(1, "a"), (1, "b")]), bulk([(1, "b"), (1, "a")])), timeout=1)
+
+    asyncio.run(main())
+
+
+def test_repeated_submission_writes_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "outbox", Outbox(str(tmp_path / "outbox.sqlite3"), db._replay))
+
+    async def main():
+        row = db.punishment_row(db.GUILD_ID, "twice", None, "Spam", 1, 1, 1.0, 1.0, 1)
+        first = await db.record_ban([row], key="ban:42")
+        second = await db.record_ban([row], key="ban:42")
+        await db.outbox.drain()
+        third = await db.record_ban([row], key="ban:42")
+        stages = await db.backend.get_punishment_stages(db.GUILD_ID, ["twice"], ["Spam"])
+        return first, second, third, await db.was_recorded("ban:42"), stages
+
+    first, second, third, recorded, stages = asyncio.run(main())
+    assert [row["write_key"] for row in first] == ["ban:42"]
+    assert second is None and third is None and recorded
+    assert [row["stage"] for row in stages] == [1]
+
+    # Replaying the key again, as after a crash between the write and marking it applied, is a no-op too.
+    asyncio.run(db.backend.record_ban("ban:42", first, [], datetime.now(timezone.utc)))
+    rows = db.backend._executor.submit(db.backend._query, "select count(*) as n from punishments where user_id = 'twice'").result()
+    assert rows[0]["n"] == 1
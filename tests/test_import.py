@@ -0,0 +1,23 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from storage.sqlite_backend import SQLiteBackend
+
+DECAY_PERIOD = 60 * 60 * 24 * 60
+
+
+def test_imported_infractions_are_scored():
+    backend = SQLiteBackend(":memory:", decay_factor=0.95, decay_period=DECAY_PERIOD, home_guild_id=1)
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"guild_id": 1, "user_id": "a", "points": 2.0, "timestamp": (now - timedelta(days=1)).isoformat()},
+        {"guild_id": 1, "user_id": "a", "points": 1.0, "timestamp": (now - timedelta(days=130)).isoformat()},
+        {"guild_id": 1, "user_id": "b", "points": 3.0, "timestamp": (now - timedelta(days=70)).isoformat()},
+    ]
+    try:
+        asyncio.run(backend.import_rows("infractions", rows))
+        scores = asyncio.run(backend.get_user_scores(1, ["a", "b"]))
+    finally:
+        backend.close()
+
+    assert {row["user_id"]: round(row["score"], 4) for row in scores} == {"a": round(2.0 + 0.95 ** 2, 4), "b": 2.85}
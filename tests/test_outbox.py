@@ -0,0 +1,127 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import db
+from outbox import Outbox
+
+
+class Sender:
+    """Records replayed keys; raises the queued errors first, one per call."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.keys = []
+
+    async def __call__(self, key, punishments, infractions, created_at):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.keys.append(key)
+
+
+def open_outbox(path, sender):
+    return Outbox(str(path), sender, is_transient=lambda error: isinstance(error, OSError), retry_delay=0)
+
+
+def test_replays_in_order(tmp_path):
+    async def main():
+        sender = Sender(OSError("connection reset"))  # a transient error is retried, not skipped
+        outbox = open_outbox(tmp_path / "outbox.sqlite3", sender)
+        for key in ("a", "b", "c"):
+            await outbox.append(key, [], [])
+        await outbox.drain()
+        return sender.keys, len(outbox)
+
+    assert asyncio.run(main()) == (["a", "b", "c"], 0)
+
+
+def test_duplicate_key_is_a_no_op(tmp_path):
+    async def main():
+        sender = Sender()
+        outbox = open_outbox(tmp_path / "outbox.sqlite3", sender)
+        first = await outbox.append("a", [{"user_id": "u"}], [])
+        pending_duplicate = await outbox.append("a", [{"user_id": "u"}], [])
+        await outbox.drain()
+        replayed_duplicate = await outbox.append("a", [{"user_id": "u"}], [])
+        return first is not None, pending_duplicate, replayed_duplicate, await outbox.contains("a"), sender.keys
+
+    assert asyncio.run(main()) == (True, None, None, True, ["a"])
+
+
+def test_pending_entries_survive_a_restart(tmp_path):
+    async def main():
+        async def down(*args):
+            raise OSError("down")
+
+        outbox = open_outbox(tmp_path / "outbox.sqlite3", down)
+        await outbox.append("a", [], [])
+        await outbox.append("b", [], [])
+
+    asyncio.run(main())
+    reopened = open_outbox(tmp_path / "outbox.sqlite3", Sender())
+    assert [entry["key"] for entry in reopened.pending] == ["a", "b"]
+
+
+def test_rejected_write_is_dead_lettered_and_requeued_on_restart(tmp_path):
+    reported = []
+
+    async def report(entry, error):
+        reported.append((entry["key"], str(error)))
+
+    async def main():
+        sender = Sender(ValueError("column does not exist"))
+        outbox = open_outbox(tmp_path / "outbox.sqlite3", sender)
+        outbox.on_dead_letter = report
+        await outbox.append("bad", [], [])
+        await outbox.append("good", [], [])
+        await outbox.drain()
+        return sender.keys, await outbox.contains("bad")
+
+    assert asyncio.run(main()) == (["good"], False)  # later writes are not held up
+    assert reported == [("bad", "column does not exist")]
+
+    reopened = open_outbox(tmp_path / "outbox.sqlite3", Sender())
+    assert [entry["key"] for entry in reopened.pending] == ["bad"]
+
+
+@pytest.fixture
+def pending():
+    """Entries put straight into db's outbox queue, as if their replay had not run yet."""
+    entries = []
+
+    def add(key, punishments=(), infractions=(), created_at=None):
+        entry = {"key": key, "punishments": list(punishments), "infractions": list(infractions),
+                 "created_at": created_at or time.time()}
+        db.outbox.pending.append(entry)
+        entries.append(entry)
+
+    yield add
+    for entry in entries:
+        db.outbox.pending.remove(entry)
+
+
+def ban(user_id, reason, stage):
+    return db.punishment_row(db.GUILD_ID, user_id, None, reason, 1, 1, 1.0, 1.0, stage)
+
+
+def test_stages_include_pending_bans(pending):
+    asyncio.run(db.backend.record_ban("stages-1", [ban("stages", "Spam", 1)], [], datetime.now(timezone.utc)))
+    pending("stages-2", [ban("stages", "Spam", 2), ban("stages", "Toxicity", 1)])
+
+    stages = asyncio.run(db.get_stages_for_users(db.GUILD_ID, ["stages"], ["Spam", "Toxicity", "Griefing"]))
+    assert stages == {"stages": {"Spam": 3, "Toxicity": 2, "Griefing": 1}}
+
+
+def test_decayed_points_count_pending_rows_after_the_checkpoint(pending):
+    now = datetime.now(timezone.utc)
+    recorded = now - timedelta(minutes=5)
+    infraction = {"guild_id": db.GUILD_ID, "user_id": "points", "points": 2.0, "context": "test", "source": "automated"}
+    asyncio.run(db.backend.record_ban("points-1", [], [infraction], recorded))
+    # Replayed but still queued: at the checkpoint, so already in the score.
+    pending("points-1", infractions=[infraction], created_at=recorded.timestamp())
+    pending("points-2", infractions=[{**infraction, "points": 3.0}])
+
+    points = asyncio.run(db.get_decayed_points_many(db.GUILD_ID, ["points", "nobody"], now))
+    assert points == {"points": 5.0, "nobody": 0.0}